@@ -0,0 +1,60 @@
+"""
+archive.py - Move old completed tasks to cold storage
+
+Completed tasks whose completed_at is older than a cutoff are deleted from
+`tasks` and written to `tasks_archive`, one bounded batch per transaction,
+so the hot table stays small without holding long locks.
+
+HOW TO RUN:
+    python cli.py archive --older-than-days 30
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+from models import Tasks, TasksArchive
+
+# Columns copied as-is from tasks to tasks_archive
+ARCHIVED_COLUMNS = [
+    c.key for c in TasksArchive.__table__.columns if c.key in Tasks.__table__.columns
+]
+
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int, now: datetime) -> int:
+    """Archives up to batch_size tasks in one transaction. Returns how many."""
+    archivable = (Tasks.complete == True, Tasks.completed_at < cutoff)
+    ids = [row[0] for row in db.execute(
+        select(Tasks.id)
+        .where(*archivable)
+        .order_by(Tasks.id)
+        .limit(batch_size)
+    )]
+    if not ids:
+        return 0
+
+    # The DELETE checks the predicate again, so a task reopened since the
+    # SELECT stays; only the rows it actually deleted are archived
+    source_columns = [Tasks.__table__.c[key] for key in ARCHIVED_COLUMNS]
+    rows = db.execute(
+        delete(Tasks).where(Tasks.id.in_(ids)).where(*archivable)
+        .returning(*source_columns),
+        execution_options={'synchronize_session': False}
+    ).mappings().all()
+    if rows:
+        db.execute(insert(TasksArchive), [{**row, 'archived_at': now} for row in rows])
+    db.commit()
+    return len(rows)
+
+
+def archive_completed_tasks(db: Session, older_than: timedelta, batch_size: int = 500,
+                            now: Optional[datetime] = None) -> int:
+    """Archives every completed task older than older_than. Returns how many."""
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - older_than
+    total = 0
+    while True:
+        moved = archive_batch(db, cutoff, batch_size, now)
+        total += moved
+        if moved == 0:
+            return total
@@ -0,0 +1,236 @@
+"""
+audit.py - Append-only task history
+
+Task writes are recorded as events holding the task's state after the
+write (a snapshot). Events are buffered in memory and inserted in batches,
+when `max_batch` events are waiting or every `max_delay` seconds, so the
+request itself never waits for an audit INSERT. Before/after diffs are
+derived from consecutive snapshots when history is read.
+
+compact_events() is the retention job: it drops events older than a
+cutoff but keeps the newest old event of every live task as the baseline
+for later diffs.
+
+Events of a process that crashes before a flush are lost; the buffer
+trades that for not adding a write to every request. History reads never
+flush: they show what other workers wrote up to `max_delay` seconds late,
+plus this process's own buffered events (AuditLog.pending).
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional, Sequence, Tuple
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, delete, insert, or_, select
+from sqlalchemy.orm import Session
+from models import TaskEvents, Tasks
+
+logger = logging.getLogger("taskapp.audit")
+
+# Columns kept in snapshots; version changes on every write and says nothing
+SNAPSHOT_COLUMNS = [c.key for c in Tasks.__table__.columns if c.key != 'version']
+
+
+def snapshot(values) -> dict:
+    """Task state from an ORM object or a row mapping."""
+    if isinstance(values, Tasks):
+        values = {key: getattr(values, key) for key in SNAPSHOT_COLUMNS}
+    return jsonable_encoder({key: values[key] for key in SNAPSHOT_COLUMNS if key in values})
+
+
+class AuditLog:
+
+    def __init__(self, session_factory: Callable[[], Session],
+                 max_batch: int = 500, max_delay: float = 1.0):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._buffer: List[dict] = []
+        self._lock = threading.Lock()
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def record(self, action: str, task_id: int, owner_id: int, actor_id: int,
+               state: Optional[dict]) -> None:
+        event = {
+            'task_id': task_id,
+            'owner_id': owner_id,
+            'actor_id': actor_id,
+            'action': action,
+            'snapshot': json.dumps(state) if state is not None else None,
+            'ts': datetime.now(timezone.utc),
+        }
+        with self._lock:
+            self._buffer.append(event)
+            full = len(self._buffer) >= self.max_batch
+        if not full:
+            return
+        if self._loop is not None:
+            # Let the background flusher do the INSERT
+            self._loop.call_soon_threadsafe(self._wake.set)
+        else:
+            self.flush()
+
+    def pending(self, task_id: int, owner_id: Optional[int] = None) -> List[dict]:
+        """This process's buffered events of one task, for read-your-writes."""
+        with self._lock:
+            return [event for event in self._buffer if event['task_id'] == task_id
+                    and (owner_id is None or event['owner_id'] == owner_id)]
+
+    def flush(self) -> int:
+        """Writes all buffered events in one INSERT. Returns how many."""
+        with self._lock:
+            events, self._buffer = self._buffer, []
+        if not events:
+            return 0
+        try:
+            with self.session_factory() as db:
+                db.execute(insert(TaskEvents), events)
+                db.commit()
+        except Exception:
+            # Keep them for the next attempt
+            with self._lock:
+                self._buffer[:0] = events
+            raise
+        return len(events)
+
+    async def run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                try:
+                    await asyncio.to_thread(self.flush)
+                except Exception:
+                    logger.exception("Audit flush failed")
+        finally:
+            self._loop = None
+            self._wake = None
+
+
+def diff(before: Optional[dict], after: Optional[dict]) -> dict:
+    """{field: [old, new]} for every field that changed."""
+    before = before or {}
+    after = after or {}
+    return {key: [before.get(key), after.get(key)]
+            for key in sorted(set(before) | set(after))
+            if before.get(key) != after.get(key)}
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; they are stored in UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _newest_first(event: dict):
+    # Pending events have no id yet; they are newer than any stored one at the same ts
+    return event['ts'], float('inf') if event['id'] is None else event['id']
+
+
+def latest_state(db: Session, task_id: int,
+                 pending: Sequence[dict] = ()) -> Optional[Tuple[int, dict]]:
+    """
+    (owner_id, snapshot) of the newest event of a task that has a snapshot,
+    buffered ones first, or None. Works for deleted and archived tasks too.
+    """
+    buffered = [event for event in pending if event['snapshot']]
+    if buffered:
+        event = max(buffered, key=lambda event: event['ts'])
+        return event['owner_id'], json.loads(event['snapshot'])
+    row = db.query(TaskEvents.owner_id, TaskEvents.snapshot)\
+        .filter(TaskEvents.task_id == task_id).filter(TaskEvents.snapshot.isnot(None))\
+        .order_by(TaskEvents.ts.desc(), TaskEvents.id.desc()).first()
+    return (row.owner_id, json.loads(row.snapshot)) if row is not None else None
+
+
+def read_history(db: Session, task_id: int, owner_id: int, before_id: Optional[int],
+                 limit: int, pending: Sequence[dict] = ()) -> List[dict]:
+    """
+    Newest first by (ts, id); page with before_id = last id seen. One extra
+    (older) event is read so the oldest one on the page also gets its diff.
+
+    pending are this process's events that are not flushed yet (AuditLog.pending);
+    they have no id and are added to the first page, on top of `limit`.
+    """
+    query = db.query(TaskEvents).filter(TaskEvents.task_id == task_id)\
+        .filter(TaskEvents.owner_id == owner_id)
+    if before_id is not None:
+        # Workers flush on their own schedule, so id order is not ts order:
+        # continue after the cursor event's (ts, id), which (task_id, ts) serves
+        before_ts = db.query(TaskEvents.ts).filter(TaskEvents.id == before_id)\
+            .filter(TaskEvents.task_id == task_id)\
+            .filter(TaskEvents.owner_id == owner_id).scalar()
+        if before_ts is None:
+            return []
+        query = query.filter(or_(TaskEvents.ts < before_ts,
+                                 and_(TaskEvents.ts == before_ts, TaskEvents.id < before_id)))
+    rows = query.order_by(TaskEvents.ts.desc(), TaskEvents.id.desc()).limit(limit + 1).all()
+
+    stored = [{'id': row.id, 'action': row.action, 'actor_id': row.actor_id,
+               'ts': _as_utc(row.ts), 'snapshot': row.snapshot} for row in rows]
+    page, extra = stored[:limit], stored[limit:]
+    if before_id is None and pending:
+        page = sorted(page + [{**event, 'id': None} for event in pending],
+                      key=_newest_first, reverse=True)
+
+    events = page + extra
+    history = []
+    for event, previous in zip(page, events[1:] + [None]):
+        before = json.loads(previous['snapshot']) if previous and previous['snapshot'] else None
+        after = json.loads(event['snapshot']) if event['snapshot'] else None
+        history.append({
+            'id': event['id'],
+            'action': event['action'],
+            'actor_id': event['actor_id'],
+            'ts': event['ts'],
+            'changes': diff(before, after),
+        })
+    return history
+
+
+def compact_events(db: Session, older_than: timedelta, batch_size: int = 500,
+                   now: Optional[datetime] = None) -> int:
+    """
+    Deletes events older than the cutoff, except the newest (by ts, then id)
+    old event of each task that still exists. Runs one batch of tasks per
+    transaction. Returns how many events were deleted.
+    """
+    cutoff = (now or datetime.now(timezone.utc)) - older_than
+    deleted = 0
+    after = (0, 0)
+    while True:
+        # Next batch of tasks with old events, in (task_id, owner_id) order
+        tasks = db.execute(
+            select(TaskEvents.task_id, TaskEvents.owner_id)
+            .where(TaskEvents.ts < cutoff)
+            .where(or_(TaskEvents.task_id > after[0],
+                       and_(TaskEvents.task_id == after[0], TaskEvents.owner_id > after[1])))
+            .distinct()
+            .order_by(TaskEvents.task_id, TaskEvents.owner_id)
+            .limit(batch_size)
+        ).all()
+        if not tasks:
+            return deleted
+
+        for task_id, owner_id in tasks:
+            old = and_(TaskEvents.task_id == task_id, TaskEvents.owner_id == owner_id,
+                       TaskEvents.ts < cutoff)
+            keep_id, keep_action = db.execute(
+                select(TaskEvents.id, TaskEvents.action).where(old)
+                .order_by(TaskEvents.ts.desc(), TaskEvents.id.desc()).limit(1)
+            ).one()
+            stmt = delete(TaskEvents).where(old)
+            if keep_action != 'delete':
+                stmt = stmt.where(TaskEvents.id != keep_id)
+            deleted += db.execute(
+                stmt, execution_options={'synchronize_session': False}).rowcount
+        db.commit()
+        after = tuple(tasks[-1])
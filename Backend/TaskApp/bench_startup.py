@@ -0,0 +1,68 @@
+"""
+bench_startup.py - Cold start benchmark
+
+Measures the time from a fresh interpreter importing the app to the first
+request being answered (app startup included). Each run is a new process,
+so nothing is shared between runs.
+
+HOW TO RUN:
+    python bench_startup.py --runs 5
+    python bench_startup.py --runs 5 --max-ms 1500 --json startup.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Runs in the child process; prints milliseconds from first import to first response
+CHILD = """
+import time
+start = time.perf_counter()
+from fastapi.testclient import TestClient
+from main import app
+with TestClient(app) as client:
+    response = client.get("/tasks/")
+    assert response.status_code == 401, response.status_code
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+def measure_once() -> float:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Cold import-to-first-request benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, help="fail if the median exceeds this")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    timings = [measure_once() for _ in range(args.runs)]
+    result = {
+        "runs": args.runs,
+        "median_ms": round(statistics.median(timings), 1),
+        "min_ms": round(min(timings), 1),
+        "max_ms": round(max(timings), 1),
+    }
+    print(f"cold start: median {result['median_ms']} ms "
+          f"(min {result['min_ms']}, max {result['max_ms']}, {args.runs} runs)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.max_ms is not None and result["median_ms"] > args.max_ms:
+        print(f"FAIL: median above budget of {args.max_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""
+cli.py - Management commands
+
+HOW TO RUN:
+    python cli.py initdb      # create missing tables/columns (main database + shards)
+    python cli.py archive     # move old completed tasks to tasks_archive
+    python cli.py serve       # production server, one worker per CPU
+    python cli.py purge-idempotency-keys   # drop expired Idempotency-Key entries
+    python cli.py compact-audit            # drop task history past its retention
+"""
+
+import argparse
+import importlib.util
+import inspect
+import os
+from datetime import timedelta
+from typing import Tuple
+import database
+from config import get_settings
+
+
+def initdb(args) -> None:
+    database.init_engines(get_settings())
+    try:
+        changes = database.create_schema()
+    finally:
+        database.dispose_engines()
+    for change in changes:
+        print(change)
+    print("Database schema is up to date.")
+
+
+def archive(args) -> None:
+    from archive import archive_completed_tasks
+    settings = get_settings()
+    days = args.older_than_days if args.older_than_days is not None else settings.archive_after_days
+    database.init_engines(settings)
+    try:
+        total = 0
+        for session_factory in database.task_session_factories():
+            db = session_factory()
+            try:
+                total += archive_completed_tasks(db, timedelta(days=days), args.batch_size)
+            finally:
+                db.close()
+    finally:
+        database.dispose_engines()
+    print(f"Archived {total} task(s) completed more than {days} day(s) ago.")
+
+
+def purge_idempotency_keys(args) -> None:
+    from idempotency import purge_expired
+    settings = get_settings()
+    database.init_engines(settings)
+    try:
+        total = 0
+        for session_factory in database.task_session_factories():
+            db = session_factory()
+            try:
+                total += purge_expired(db, timedelta(hours=settings.idempotency_ttl_hours))
+            finally:
+                db.close()
+    finally:
+        database.dispose_engines()
+    print(f"Removed {total} expired idempotency key(s).")
+
+
+def compact_audit(args) -> None:
+    from audit import compact_events
+    settings = get_settings()
+    days = args.older_than_days if args.older_than_days is not None else settings.audit_retention_days
+    database.init_engines(settings)
+    try:
+        # Audit events live in the main database, also when tasks are sharded
+        db = database.SessionLocal()
+        try:
+            total = compact_events(db, timedelta(days=days), args.batch_size)
+        finally:
+            db.close()
+    finally:
+        database.dispose_engines()
+    print(f"Removed {total} audit event(s) older than {days} day(s).")
+
+
+def default_workers() -> int:
+    # CPUs this process may actually run on (respects container/affinity limits)
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return os.cpu_count() or 1
+
+
+def pool_sizing(budget: int, workers: int) -> Tuple[int, int]:
+    """
+    Splits a connection budget evenly over the workers.
+
+    Returns (pool_size, max_overflow) per worker; overflow is 0 so the
+    workers together can never exceed the budget.
+    """
+    if budget < workers:
+        raise ValueError(f"Connection budget {budget} is smaller than {workers} workers.")
+    return budget // workers, 0
+
+
+def serve(args) -> None:
+    import uvicorn
+    settings = get_settings()
+    workers = 1 if args.reload else (args.workers or default_workers())
+
+    budget = args.db_connection_budget or settings.db_connection_budget
+    if budget:
+        pool_size, max_overflow = pool_sizing(budget, workers)
+        # Workers are separate processes that read their settings from the environment
+        os.environ["DB_POOL_SIZE"] = str(pool_size)
+        os.environ["DB_MAX_OVERFLOW"] = str(max_overflow)
+        # A single worker runs in this process and must not reuse the cached settings
+        get_settings.cache_clear()
+    else:
+        pool_size, max_overflow = settings.db_pool_size, settings.db_max_overflow
+
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    print(f"Starting {workers} worker(s) on {args.host}:{args.port} "
+          f"(loop={loop}, http={http}, db pool={pool_size}+{max_overflow} per worker)")
+
+    options = dict(
+        host=args.host,
+        port=args.port,
+        workers=None if args.reload else workers,
+        reload=args.reload,
+        loop=loop,
+        http=http,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+    # Recycling only makes sense with a supervisor to start the replacement;
+    # a single worker would just exit
+    if workers > 1 and args.max_requests:
+        options["limit_max_requests"] = args.max_requests
+        # Older uvicorn versions recycle every worker after exactly max_requests
+        if "limit_max_requests_jitter" in inspect.signature(uvicorn.Config).parameters:
+            options["limit_max_requests_jitter"] = args.max_requests_jitter
+    uvicorn.run("main:app", **options)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="taskapp", description="Task Management System")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    initdb_parser = commands.add_parser("initdb", help="create database tables")
+    initdb_parser.set_defaults(func=initdb)
+
+    archive_parser = commands.add_parser("archive", help="archive old completed tasks")
+    archive_parser.add_argument("--older-than-days", type=int,
+                                help="default: ARCHIVE_AFTER_DAYS (30)")
+    archive_parser.add_argument("--batch-size", type=int, default=500,
+                                help="tasks moved per transaction")
+    archive_parser.set_defaults(func=archive)
+
+    purge_parser = commands.add_parser("purge-idempotency-keys",
+                                       help="remove Idempotency-Key entries past their TTL")
+    purge_parser.set_defaults(func=purge_idempotency_keys)
+
+    compact_parser = commands.add_parser("compact-audit",
+                                         help="remove task history past its retention")
+    compact_parser.add_argument("--older-than-days", type=int,
+                                help="default: AUDIT_RETENTION_DAYS (90)")
+    compact_parser.add_argument("--batch-size", type=int, default=500,
+                                help="tasks compacted per transaction")
+    compact_parser.set_defaults(func=compact_audit)
+
+    serve_parser = commands.add_parser("serve", help="run the API with uvicorn workers")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--workers", type=int,
+                              help="default: number of available CPUs")
+    serve_parser.add_argument("--reload", action="store_true",
+                              help="single worker, restart on code changes (development)")
+    serve_parser.add_argument("--max-requests", type=int, default=10000,
+                              help="recycle a worker after this many requests (0 = never)")
+    serve_parser.add_argument("--max-requests-jitter", type=int, default=1000,
+                              help="random extra requests so workers don't recycle together")
+    serve_parser.add_argument("--graceful-timeout", type=int, default=30,
+                              help="seconds to finish in-flight requests on shutdown")
+    serve_parser.add_argument("--db-connection-budget", type=int,
+                              help="max DB connections for all workers together "
+                                   "(default: DB_CONNECTION_BUDGET)")
+    serve_parser.set_defaults(func=serve)
+
+    return parser
+
+
+def main(argv=None) -> None:
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
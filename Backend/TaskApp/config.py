@@ -0,0 +1,66 @@
+from functools import lru_cache
+from typing import List, Optional
+from fastapi import Request
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """
+    Application settings, read from environment variables (or ../.env).
+
+    Field names map to upper-case env vars, e.g. database_url -> DATABASE_URL.
+    """
+    model_config = SettingsConfigDict(env_file="../.env", extra="ignore")
+
+    # Use SQLite by default (easy setup), or PostgreSQL via DATABASE_URL
+    # SQLite creates a file called tasks.db - no installation needed!
+    database_url: str = "sqlite:///./tasks.db"
+
+    # Optional sharded mode: comma-separated URLs, one per task shard.
+    # Users stay in DATABASE_URL; tasks are spread across the shards by owner_id.
+    database_shard_urls: str = ""
+
+    # Connection pool per process and per database (ignored for SQLite).
+    # `python cli.py serve` derives these from DB_CONNECTION_BUDGET.
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    # Max connections all workers together may open to one database
+    db_connection_budget: Optional[int] = None
+
+    secret_key: str = "your-secret-key-change-this-in-production"
+
+    # bcrypt cost factor; only lower it for tests
+    bcrypt_rounds: int = 12
+
+    # CORS configuration for React (JSON list in the environment)
+    cors_origins: List[str] = ["http://localhost:3000"]
+
+    # Reminder scheduler (run it in every worker; reminders fire once)
+    reminders_enabled: bool = False
+    reminder_interval_seconds: float = 1.0
+    reminder_horizon_seconds: int = 60
+
+    # Completed tasks older than this are moved to tasks_archive
+    archive_after_days: int = 30
+
+    # How long a stored Idempotency-Key response is replayed
+    idempotency_ttl_hours: int = 24
+
+    # Task history: buffered writes, flushed by size or age
+    audit_batch_size: int = 500
+    audit_flush_seconds: float = 1.0
+    audit_retention_days: int = 90
+
+    @property
+    def shard_urls(self) -> List[str]:
+        return [url.strip() for url in self.database_shard_urls.split(",") if url.strip()]
+
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
+
+
+def get_app_settings(request: Request) -> Settings:
+    """Dependency returning the settings the running app was created with."""
+    return request.app.state.settings
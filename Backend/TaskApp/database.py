@@ -1,35 +1,204 @@
-import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
-from dotenv import load_dotenv
-
-load_dotenv(dotenv_path="../.env")
-
-# Use SQLite by default (easy setup), or PostgreSQL via environment variable
-# SQLite creates a file called tasks.db - no installation needed!
-SQLALCHEMY_DATABASE_URL = os.getenv(
-    "DATABASE_URL", 
-    "sqlite:///./tasks.db"
-)
-
-# SQLite requires special connect_args
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, 
-        connect_args={"check_same_thread": False}
-    )
-else:
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL
-    )
+from functools import partial
+from typing import Callable, List, Optional, Sequence
+from sqlalchemy import create_engine, delete, func, insert, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn, CreateTable
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from config import Settings
+from sharding import ShardSet
+
+# Engines are created by init_engines() (called from the app lifespan or the
+# CLI), so importing this module never touches the database.
+engine: Optional[Engine] = None
+shards: Optional[ShardSet] = None
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 Base = declarative_base()
 
+def make_engine(url: str, pool_size: int = 5, max_overflow: int = 10):
+    # SQLite requires special connect_args
+    if url.startswith("sqlite"):
+        return create_engine(
+            url,
+            connect_args={"check_same_thread": False}
+        )
+    return create_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=max_overflow
+    )
+
+def init_engines(settings: Settings) -> None:
+    global engine, shards
+    pool = {"pool_size": settings.db_pool_size, "max_overflow": settings.db_max_overflow}
+    engine = make_engine(settings.database_url, **pool)
+    SessionLocal.configure(bind=engine)
+    shard_urls = settings.shard_urls
+    shards = ShardSet([make_engine(url, **pool) for url in shard_urls]) if shard_urls else None
+
+def dispose_engines() -> None:
+    global engine, shards
+    if engine is not None:
+        engine.dispose()
+    if shards is not None:
+        for shard_engine in shards.engines.values():
+            shard_engine.dispose()
+    engine = None
+    shards = None
+
+# Tables a shard holds; users, projects and the rest stay in the main database
+SHARD_TABLES = ('tasks', 'tasks_archive', 'idempotency_keys')
+
+def create_shard_tables(bind: Engine) -> None:
+    """
+    Creates the missing shard tables without foreign keys: the users and
+    projects they point at only exist in the main database.
+    """
+    with bind.begin() as connection:
+        existing_tables = set(inspect(connection).get_table_names())
+        for name in SHARD_TABLES:
+            if name in existing_tables:
+                continue
+            table = Base.metadata.tables[name]
+            connection.execute(CreateTable(table, include_foreign_key_constraints=[]))
+            for index in table.indexes:
+                index.create(bind=connection)
+
+def upgrade_schema(bind: Engine, table_names: Optional[Sequence[str]] = None) -> List[str]:
+    """
+    Adds the columns and indexes that tables created by an older version are
+    missing (create_all never alters an existing table), and drops foreign
+    keys to tables this database doesn't hold. Returns what was done.
+    """
+    tables = [table for table in Base.metadata.sorted_tables
+              if table_names is None or table.name in table_names]
+    held = {table.name for table in tables}
+    changes: List[str] = []
+    with bind.begin() as connection:
+        inspector = inspect(connection)
+        existing_tables = set(inspector.get_table_names())
+        for table in tables:
+            if table.name not in existing_tables:
+                continue
+            # Shards used to be created with the main database's foreign keys.
+            # SQLite can't drop a constraint, but doesn't enforce it by default.
+            if connection.dialect.name != 'sqlite':
+                for foreign_key in inspector.get_foreign_keys(table.name):
+                    if foreign_key['referred_table'] not in held:
+                        connection.exec_driver_sql(
+                            f"ALTER TABLE {table.name} DROP CONSTRAINT {foreign_key['name']}")
+                        changes.append(f"dropped foreign key {table.name}.{foreign_key['name']}")
+            columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} "
+                                       "without a server default.")
+                spec = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {spec}")
+                changes.append(f"added column {table.name}.{column.name}")
+
+            indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(bind=connection)
+                    changes.append(f"added index {index.name}")
+    return changes
+
+def highest_task_id(shard_set: ShardSet) -> int:
+    # Largest id any shard handed out itself, live or archived
+    import models
+    highest = 0
+    for name in shard_set.names:
+        with shard_set.session(name) as db:
+            for table in (models.Tasks, models.TasksArchive):
+                highest = max(highest, db.execute(select(func.max(table.id))).scalar() or 0)
+    return highest
+
+def seed_task_ids(db: Session, highest: int) -> bool:
+    """
+    Makes the allocator skip every id up to `highest` (ids the shards
+    handed out themselves). Returns True if it had to move forward.
+    """
+    import models
+    if allocate_task_id(db) > highest:
+        return False
+    if db.get_bind().dialect.name == 'postgresql':
+        db.execute(text("SELECT setval(pg_get_serial_sequence('task_ids', 'id'), :highest)"),
+                   {'highest': highest})
+    else:
+        # SQLite AUTOINCREMENT remembers the largest id ever inserted
+        db.execute(insert(models.TaskIds).values(id=highest))
+        db.execute(delete(models.TaskIds).where(models.TaskIds.id == highest))
+    db.commit()
+    return True
+
+def create_schema() -> List[str]:
+    """Creates missing tables and upgrades existing ones, on every database."""
+    # Importing models registers the tables on Base.metadata
+    import models
+    from ordering import backfill_positions
+    from reminders import clear_completed_reminders
+    shard_engines = list(shards.engines.values()) if shards is not None else []
+    models.Base.metadata.create_all(bind=engine)
+    changes = upgrade_schema(engine)
+    for shard_engine in shard_engines:
+        create_shard_tables(shard_engine)
+        changes += upgrade_schema(shard_engine, SHARD_TABLES)
+
+    for bind in [engine] + shard_engines:
+        with Session(bind=bind) as db:
+            lists = backfill_positions(db)
+            cleared = clear_completed_reminders(db)
+        if lists:
+            changes.append(f"ordered {lists} task list(s) without positions")
+        if cleared:
+            changes.append(f"cleared reminders of {cleared} completed task(s)")
+
+    if shards is not None:
+        highest = highest_task_id(shards)
+        with SessionLocal() as db:
+            if seed_task_ids(db, highest):
+                changes.append(f"task ids now start after {highest}")
+    return changes
+
+def task_session_factories() -> List[Callable[[], Session]]:
+    # One session factory per database holding tasks
+    if shards is None:
+        return [SessionLocal]
+    return [partial(shards.session, name) for name in shards.names]
+
+def task_session_for(owner_id: int) -> Session:
+    # New session on the database holding owner_id's tasks, for work outside a request
+    if shards is None:
+        return SessionLocal()
+    return shards.session_for(owner_id)
+
+def allocate_task_id(db: Session) -> int:
+    """
+    Next task id from the main database's allocator (db is a main database
+    session). Only used in sharded mode; commits on its own.
+    """
+    import models
+    task_id = db.execute(insert(models.TaskIds).returning(models.TaskIds.id)).scalar_one()
+    db.execute(delete(models.TaskIds).where(models.TaskIds.id == task_id))
+    db.commit()
+    return task_id
+
+def is_sharded() -> bool:
+    return shards is not None
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def get_shard_db(owner_id: int):
+    db = shards.session_for(owner_id)
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,102 @@
+"""
+idempotency.py - Idempotency-Key support for creating requests
+
+A client sends the same Idempotency-Key header on every retry of one
+logical request. The first request stores its response under
+(user_id, key) in the same transaction as the rows it creates; retries get
+that stored response back instead of running the insert again.
+
+Concurrent duplicates are settled by the primary key: the loser's INSERT
+fails (after waiting for the winner to commit), and it replays the
+winner's response. Entries older than the TTL are ignored and removed by
+`python cli.py purge-idempotency-keys`.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import IdempotencyKeys
+
+
+def fingerprint(request: BaseModel) -> str:
+    return hashlib.sha256(request.model_dump_json().encode("utf-8")).hexdigest()
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; they are stored in UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _replay(entry: IdempotencyKeys, request_hash: str) -> JSONResponse:
+    if entry.request_hash != request_hash:
+        raise HTTPException(status_code=422,
+                            detail='Idempotency-Key was already used for a different request.')
+    return JSONResponse(status_code=entry.status_code, content=json.loads(entry.response_body),
+                        headers={'Idempotent-Replayed': 'true'})
+
+
+def _find(db: Session, user_id: int, key: str, ttl: timedelta) -> Optional[IdempotencyKeys]:
+    entry = db.get(IdempotencyKeys, (user_id, key))
+    if entry is not None and _as_utc(entry.created_at) < datetime.now(timezone.utc) - ttl:
+        # Expired: forget it so the key can be used again
+        db.delete(entry)
+        db.flush()
+        return None
+    return entry
+
+
+def begin(db: Session, user_id: int, key: str, request_hash: str,
+          ttl: timedelta) -> Optional[JSONResponse]:
+    """
+    Claims the key for this request, or returns the stored response to send
+    instead. Must run before the request's own writes: on a duplicate it
+    rolls the session back.
+    """
+    entry = _find(db, user_id, key, ttl)
+    if entry is not None:
+        return _replay(entry, request_hash)
+
+    db.add(IdempotencyKeys(user_id=user_id, key=key, request_hash=request_hash,
+                           created_at=datetime.now(timezone.utc)))
+    try:
+        db.flush()
+    except IntegrityError:
+        # Another request with this key committed first
+        db.rollback()
+        return _replay(db.get(IdempotencyKeys, (user_id, key)), request_hash)
+    return None
+
+
+def finish(db: Session, user_id: int, key: str, status_code: int, body) -> None:
+    """Stores the response; commit it together with the request's writes."""
+    entry = db.get(IdempotencyKeys, (user_id, key))
+    entry.status_code = status_code
+    entry.response_body = json.dumps(jsonable_encoder(body))
+
+
+def purge_expired(db: Session, ttl: timedelta, batch_size: int = 1000) -> int:
+    """Deletes expired keys in batches. Returns how many."""
+    cutoff = datetime.now(timezone.utc) - ttl
+    total = 0
+    while True:
+        batch = db.execute(
+            select(IdempotencyKeys.user_id, IdempotencyKeys.key)
+            .where(IdempotencyKeys.created_at < cutoff)
+            .limit(batch_size)
+        ).all()
+        for user_id, key in batch:
+            db.execute(delete(IdempotencyKeys)
+                       .where(IdempotencyKeys.user_id == user_id)
+                       .where(IdempotencyKeys.key == key))
+        db.commit()
+        total += len(batch)
+        if len(batch) < batch_size:
+            return total
@@ -1,25 +1,59 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import Optional
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-import models
-from database import engine
-from routers import auth, tasks
+import database
+from audit import AuditLog
+from config import Settings, get_settings
+from reminders import ReminderScheduler
+from routers import auth, projects, tasks
 
-app = FastAPI()
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    """
+    Builds the FastAPI app. No database work happens here: engines are
+    created when the app starts, and tables by `python cli.py initdb`.
+    """
+    settings = settings or get_settings()
 
-models.Base.metadata.create_all(bind=engine)
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        database.init_engines(settings)
+        # Task history is kept in the main database, next to the users
+        audit_log = AuditLog(database.SessionLocal, max_batch=settings.audit_batch_size,
+                             max_delay=settings.audit_flush_seconds)
+        app.state.audit_log = audit_log
+        background = [asyncio.create_task(audit_log.run())]
+        if settings.reminders_enabled:
+            horizon = timedelta(seconds=settings.reminder_horizon_seconds)
+            for session_factory in database.task_session_factories():
+                scheduler = ReminderScheduler(session_factory, horizon=horizon)
+                background.append(asyncio.create_task(
+                    scheduler.run(settings.reminder_interval_seconds)))
+        yield
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        audit_log.flush()
+        app.state.audit_log = None
+        database.dispose_engines()
 
-# CORS configuration for React
-origins = [
-    "http://localhost:3000",
-]
+    app = FastAPI(lifespan=lifespan)
+    app.state.settings = settings
+    app.state.audit_log = None
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=settings.cors_origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
-app.include_router(auth.router)
-app.include_router(tasks.router)
\ No newline at end of file
+    app.include_router(auth.router)
+    app.include_router(tasks.router)
+    app.include_router(projects.router)
+    return app
+
+app = create_app()
@@ -1,5 +1,5 @@
 from database import Base
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Index, Text
 
 class Users(Base):
     __tablename__ = 'users'
@@ -10,6 +10,26 @@ class Users(Base):
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
 
+class Projects(Base):
+    # Shared task list; members (including the owner) are in project_members
+    __tablename__ = 'projects'
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)
+    owner_id = Column(Integer, ForeignKey("users.id"))
+
+class ProjectMembers(Base):
+    __tablename__ = 'project_members'
+
+    project_id = Column(Integer, ForeignKey("projects.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    role = Column(String, nullable=False)  # 'owner', 'editor' or 'viewer'
+
+    __table_args__ = (
+        # "Which projects is this user in, with which role" without touching the table
+        Index('ix_project_members_user_project_role', 'user_id', 'project_id', 'role'),
+    )
+
 class Tasks(Base):
     __tablename__ = 'tasks'
 
@@ -18,4 +38,97 @@ class Tasks(Base):
     description = Column(String)
     priority = Column(Integer)
     complete = Column(Boolean, default=False)
-    owner_id = Column(Integer, ForeignKey("users.id"))
\ No newline at end of file
+    owner_id = Column(Integer, ForeignKey("users.id"))
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)
+    # Manual order key (see ordering.py); must sort byte-wise, hence "C" on Postgres
+    position = Column(String().with_variant(String(collation="C"), "postgresql"),
+                      nullable=True)
+    due_at = Column(DateTime(timezone=True), nullable=True)
+    remind_at = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    # Bumped on every write; clients send it back in If-Match
+    version = Column(Integer, nullable=False, default=1, server_default='1')
+
+    __table_args__ = (
+        # GET /tasks/due: owner's open tasks in due_at order
+        Index('ix_tasks_owner_complete_due', 'owner_id', 'complete', 'due_at'),
+        # Reminder scheduler loads the next window of reminders
+        Index('ix_tasks_remind_at', 'remind_at'),
+        # Archiver picks completed tasks by age
+        Index('ix_tasks_complete_completed_at', 'complete', 'completed_at'),
+        # Tasks shared through a project, in the project's manual order
+        Index('ix_tasks_project_position', 'project_id', 'position'),
+        # Owner's tasks in manual order
+        Index('ix_tasks_owner_position', 'owner_id', 'position'),
+    )
+
+class TaskIds(Base):
+    # Task id allocator (main database), used when tasks are sharded so ids are
+    # unique across shards and a task keeps its id when rebalance.py moves it.
+    # Rows are deleted right after allocation; only the sequence matters.
+    __tablename__ = 'task_ids'
+
+    id = Column(Integer, primary_key=True)
+
+    __table_args__ = {'sqlite_autoincrement': True}
+
+class TasksArchive(Base):
+    # Cold storage for completed tasks moved out of `tasks` by archive.py.
+    # Keeps the original task id.
+    __tablename__ = 'tasks_archive'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    title = Column(String)
+    description = Column(String)
+    priority = Column(Integer)
+    complete = Column(Boolean, default=True)
+    owner_id = Column(Integer, ForeignKey("users.id"))
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=True)
+    due_at = Column(DateTime(timezone=True), nullable=True)
+    remind_at = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default='1')
+    archived_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        # GET /tasks/archive pages by owner in id order
+        Index('ix_tasks_archive_owner_id', 'owner_id', 'id'),
+    )
+
+class TaskEvents(Base):
+    # Append-only task history written by audit.AuditLog; snapshot is the
+    # task as JSON after the change (NULL for deletes). No foreign key to
+    # tasks: history outlives deleted and archived tasks.
+    __tablename__ = 'task_events'
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, nullable=False)
+    owner_id = Column(Integer, nullable=False)
+    actor_id = Column(Integer)
+    action = Column(String(16))  # 'create', 'update', 'move' or 'delete'
+    snapshot = Column(Text, nullable=True)
+    ts = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        # GET /tasks/{id}/history, newest first
+        Index('ix_task_events_task_ts', 'task_id', 'ts'),
+        # Retention job
+        Index('ix_task_events_ts', 'ts'),
+    )
+
+class IdempotencyKeys(Base):
+    # Stored responses of requests sent with an Idempotency-Key (idempotency.py).
+    # Lives next to the tasks it guards, so both commit together.
+    __tablename__ = 'idempotency_keys'
+
+    user_id = Column(Integer, primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64))
+    status_code = Column(Integer)
+    response_body = Column(Text)
+    created_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        # TTL purge
+        Index('ix_idempotency_keys_created_at', 'created_at'),
+    )
@@ -0,0 +1,198 @@
+"""
+ordering.py - Manual task order with fractional indexing
+
+Every task has a string `position`; lists are sorted by it byte-wise.
+key_between(a, b) returns a key that sorts strictly between two neighbours,
+so moving a task only rewrites that task's row.
+
+Keys are an integer part (a length-prefixed base-62 number, e.g. "a0",
+"a1", "b10") followed by an optional fraction, so appending or prepending
+stays short; only repeated inserts between the same two neighbours grow the
+fraction. rebalance_positions() rewrites a list's keys when they get long.
+
+Each list has its own order: a project's tasks, or an owner's tasks that
+are not in a project (list_filter()).
+
+This is the scheme of the `fractional-indexing` JavaScript package.
+"""
+
+from typing import List, Optional
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+from models import Tasks
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+SMALLEST_INTEGER = "A" + "0" * 26
+
+# Keys longer than this trigger a rebalance of the owner's positions
+MAX_KEY_LENGTH = 32
+
+
+def _integer_length(head: str) -> int:
+    if "a" <= head <= "z":
+        return ord(head) - ord("a") + 2
+    if "A" <= head <= "Z":
+        return ord("Z") - ord(head) + 2
+    raise ValueError(f"Invalid order key head: {head!r}")
+
+
+def _integer_part(key: str) -> str:
+    length = _integer_length(key[0])
+    if length > len(key):
+        raise ValueError(f"Invalid order key: {key!r}")
+    return key[:length]
+
+
+def _midpoint(a: str, b: Optional[str]) -> str:
+    # Fraction strictly between a and b (b=None means 1); neither ends in "0"
+    if b is not None:
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else "0") == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _midpoint(a[n:], b[n:])
+
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else len(DIGITS)
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b) // 2]
+    if b is not None and len(b) > 1:
+        return b[:1]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def _increment_integer(x: str) -> Optional[str]:
+    head, digits = x[0], list(x[1:])
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) + 1
+        if d < len(DIGITS):
+            digits[i] = DIGITS[d]
+            return head + "".join(digits)
+        digits[i] = "0"
+    # Carried past the first digit: one digit longer (or shorter if negative)
+    if head == "Z":
+        return "a0"
+    if head == "z":
+        return None
+    new_head = chr(ord(head) + 1)
+    if new_head > "a":
+        digits.append("0")
+    else:
+        digits.pop()
+    return new_head + "".join(digits)
+
+
+def _decrement_integer(x: str) -> Optional[str]:
+    head, digits = x[0], list(x[1:])
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) - 1
+        if d >= 0:
+            digits[i] = DIGITS[d]
+            return head + "".join(digits)
+        digits[i] = DIGITS[-1]
+    if head == "a":
+        return "Z" + DIGITS[-1]
+    if head == "A":
+        return None
+    new_head = chr(ord(head) - 1)
+    if new_head < "Z":
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return new_head + "".join(digits)
+
+
+def key_between(a: Optional[str], b: Optional[str]) -> str:
+    """
+    Returns a key sorting after a and before b. None means "start" for a
+    and "end" for b.
+    """
+    if a is not None and b is not None and a >= b:
+        raise ValueError(f"{a!r} is not before {b!r}")
+    if a is None and b is None:
+        return "a0"
+
+    if a is None:
+        int_b = _integer_part(b)
+        frac_b = b[len(int_b):]
+        if int_b == SMALLEST_INTEGER:
+            return int_b + _midpoint("", frac_b)
+        if int_b < b:
+            return int_b
+        smaller = _decrement_integer(int_b)
+        if smaller is None:
+            raise ValueError("Cannot order before the smallest key.")
+        return smaller
+
+    int_a = _integer_part(a)
+    frac_a = a[len(int_a):]
+    if b is None:
+        bigger = _increment_integer(int_a)
+        return int_a + _midpoint(frac_a, None) if bigger is None else bigger
+
+    int_b = _integer_part(b)
+    frac_b = b[len(int_b):]
+    if int_a == int_b:
+        return int_a + _midpoint(frac_a, frac_b)
+    bigger = _increment_integer(int_a)
+    if bigger is None:
+        raise ValueError("Cannot order after the largest key.")
+    if bigger < b:
+        return bigger
+    return int_a + _midpoint(frac_a, None)
+
+
+def sequential_keys(n: int) -> List[str]:
+    """n short, increasing keys: a0, a1, ..., az, b10, ..."""
+    keys: List[str] = []
+    key = None
+    for _ in range(n):
+        key = key_between(key, None)
+        keys.append(key)
+    return keys
+
+
+def list_filter(owner_id: int, project_id: Optional[int]):
+    # The list a task is ordered in: its project, or its owner's own tasks
+    if project_id is not None:
+        return Tasks.project_id == project_id
+    return and_(Tasks.owner_id == owner_id, Tasks.project_id.is_(None))
+
+
+def last_position(db: Session, owner_id: int, project_id: Optional[int]) -> Optional[str]:
+    # Served by the (project_id, position) and (owner_id, position) indexes
+    return db.query(func.max(Tasks.position))\
+        .filter(list_filter(owner_id, project_id)).scalar()
+
+
+def backfill_positions(db: Session) -> int:
+    """
+    Gives tasks created before manual ordering a position, at the end of
+    their list. Returns how many lists were rewritten.
+    """
+    rows = db.query(Tasks.owner_id, Tasks.project_id).filter(Tasks.position.is_(None))\
+        .distinct().all()
+    # A project is one list, whoever owns its tasks
+    lists = {(owner_id if project_id is None else None, project_id)
+             for owner_id, project_id in rows}
+    for owner_id, project_id in lists:
+        rebalance_positions(db, owner_id, project_id)
+    return len(lists)
+
+
+def rebalance_positions(db: Session, owner_id: int, project_id: Optional[int] = None,
+                        commit: bool = True) -> int:
+    """
+    Rewrites one list's positions (see list_filter) as short sequential keys,
+    keeping the current order (tasks without a position go last). Returns
+    how many. With commit=False the caller's transaction decides.
+    """
+    rows = db.query(Tasks.id).filter(list_filter(owner_id, project_id))\
+        .order_by(Tasks.position.is_(None), Tasks.position, Tasks.id).all()
+    for (task_id,), key in zip(rows, sequential_keys(len(rows))):
+        db.query(Tasks).filter(Tasks.id == task_id)\
+            .update({Tasks.position: key, Tasks.version: Tasks.version + 1},
+                    synchronize_session=False)
+    if commit:
+        db.commit()
+    return len(rows)
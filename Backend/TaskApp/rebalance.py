@@ -0,0 +1,179 @@
+"""
+rebalance.py - Move tasks to the shard their owner resolves to
+
+Run after adding a URL to DATABASE_SHARD_URLS:
+    python rebalance.py                # every owner on the wrong shard
+    python rebalance.py --owner 42     # a single owner
+
+An owner's tasks, archived tasks and Idempotency-Key entries are copied to
+the target shard before the copied rows are deleted from the source, so an
+interrupted run can leave duplicates but never loses tasks. A task written
+on the source during the move stays there and is moved by the next run.
+
+Tasks keep their ids: in sharded mode ids come from the main database
+(database.allocate_task_id), so they are unique across shards. A task
+created before that, whose id is already used on the target shard, gets a
+new id, and its audit events in the main database are moved to it.
+"""
+
+import argparse
+import json
+from typing import Dict, Optional
+from sqlalchemy import delete, select, tuple_, union, update
+from sqlalchemy.orm import Session
+from database import allocate_task_id, highest_task_id, seed_task_ids
+from sharding import ShardSet
+from models import IdempotencyKeys, TaskEvents, Tasks, TasksArchive
+
+
+def taken_ids(target: Session, ids) -> set:
+    # Ids on the target shard that a moved task cannot keep
+    taken = set()
+    for table in (Tasks, TasksArchive):
+        taken.update(row[0] for row in target.query(table.id).filter(table.id.in_(ids)))
+    return taken
+
+
+def reassign_id(main: Session, owner_id: int, old_id: int) -> int:
+    new_id = allocate_task_id(main)
+    main.execute(update(TaskEvents).where(TaskEvents.task_id == old_id)
+                 .where(TaskEvents.owner_id == owner_id).values(task_id=new_id))
+    main.commit()
+    return new_id
+
+
+def renumber_response(body: Optional[str], renumbered: Dict[int, int]) -> Optional[str]:
+    # A stored Idempotency-Key response holds the created task, id included
+    if not renumbered or body is None:
+        return body
+    data = json.loads(body)
+    if isinstance(data, dict) and data.get('id') in renumbered:
+        data['id'] = renumbered[data['id']]
+        return json.dumps(data)
+    return body
+
+
+def copy_rows(model, rows, target: Session, renumbered: Dict[int, int]) -> None:
+    columns = [c.key for c in model.__table__.columns]
+    for row in rows:
+        values = {key: getattr(row, key) for key in columns}
+        values['id'] = renumbered.get(row.id, row.id)
+        target.add(model(**values))
+
+
+def move_owner_tasks(owner_id: int, source: Session, target: Session, main: Session) -> int:
+    """
+    Moves an owner's tasks, archived tasks and Idempotency-Key entries.
+    Returns how many (live and archived) tasks were moved.
+    """
+    tasks = source.query(Tasks).filter(Tasks.owner_id == owner_id).all()
+    archived = source.query(TasksArchive).filter(TasksArchive.owner_id == owner_id).all()
+    keys = source.query(IdempotencyKeys).filter(IdempotencyKeys.user_id == owner_id).all()
+    if not (tasks or archived or keys):
+        return 0
+
+    taken = taken_ids(target, [row.id for row in tasks + archived])
+    renumbered = {old_id: reassign_id(main, owner_id, old_id) for old_id in sorted(taken)}
+    copy_rows(Tasks, tasks, target, renumbered)
+    copy_rows(TasksArchive, archived, target, renumbered)
+
+    # Keys already on the target were copied by an interrupted earlier run
+    existing = {row[0] for row in target.query(IdempotencyKeys.key)
+                .filter(IdempotencyKeys.user_id == owner_id)}
+    columns = [c.key for c in IdempotencyKeys.__table__.columns]
+    for entry in keys:
+        if entry.key in existing:
+            continue
+        values = {key: getattr(entry, key) for key in columns}
+        values['response_body'] = renumber_response(entry.response_body, renumbered)
+        target.add(IdempotencyKeys(**values))
+    target.commit()
+
+    # Only delete what was copied, and only unchanged: a task written on the
+    # source meanwhile (version bumped, or archived) stays there
+    no_sync = {'synchronize_session': False}
+    copied = [(task.id, task.version) for task in tasks]
+    archived_ids = [row.id for row in archived]
+    key_names = [entry.key for entry in keys]
+    deleted = {row[0] for row in source.execute(
+        delete(Tasks).where(Tasks.owner_id == owner_id)
+        .where(tuple_(Tasks.id, Tasks.version).in_(copied))
+        .returning(Tasks.id), execution_options=no_sync)} if copied else set()
+    if archived_ids:
+        source.execute(delete(TasksArchive).where(TasksArchive.id.in_(archived_ids)),
+                       execution_options=no_sync)
+    if key_names:
+        source.execute(delete(IdempotencyKeys).where(IdempotencyKeys.user_id == owner_id)
+                       .where(IdempotencyKeys.key.in_(key_names)),
+                       execution_options=no_sync)
+    source.commit()
+
+    # Drop the now outdated copies; the next run moves those tasks again
+    changed = [renumbered.get(task_id, task_id) for task_id, _ in copied
+               if task_id not in deleted]
+    if changed:
+        target.execute(delete(Tasks).where(Tasks.id.in_(changed)), execution_options=no_sync)
+        target.commit()
+    return len(deleted) + len(archived_ids)
+
+
+def rebalance(shards: ShardSet, main: Session,
+              owner_id: Optional[int] = None) -> Dict[int, int]:
+    """
+    main is a session on the main database (id allocator and audit events).
+    Returns {owner_id: number of tasks moved}.
+    """
+    # New ids for renumbered tasks must not be in use on any shard
+    seed_task_ids(main, highest_task_id(shards))
+    moved: Dict[int, int] = {}
+    for name in shards.names:
+        source = shards.session(name)
+        try:
+            if owner_id is None:
+                owners = [row[0] for row in source.execute(union(
+                    select(Tasks.owner_id), select(TasksArchive.owner_id),
+                    select(IdempotencyKeys.user_id)))]
+            else:
+                owners = [owner_id]
+
+            for owner in owners:
+                target_name = shards.shard_for(owner)
+                if target_name == name:
+                    continue
+                target = shards.session(target_name)
+                try:
+                    count = move_owner_tasks(owner, source, target, main)
+                finally:
+                    target.close()
+                if count:
+                    moved[owner] = moved.get(owner, 0) + count
+        finally:
+            source.close()
+    return moved
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--owner", type=int, help="only move this owner's tasks")
+    args = parser.parse_args(argv)
+
+    import database
+    from config import get_settings
+    database.init_engines(get_settings())
+    shards = database.shards
+    if shards is None:
+        parser.error("DATABASE_SHARD_URLS is not set, nothing to rebalance.")
+
+    main_db = database.SessionLocal()
+    try:
+        moved = rebalance(shards, main_db, args.owner)
+    finally:
+        main_db.close()
+        database.dispose_engines()
+    for owner, count in sorted(moved.items()):
+        print(f"owner {owner}: moved {count} task(s) to {shards.shard_for(owner)}")
+    print(f"Done, {sum(moved.values())} task(s) moved.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+reminders.py - Task reminder scheduler
+
+Keeps the reminders due within the next `horizon` in a min-heap and fires
+them from memory. The database is only read when the loaded window runs
+out, with an index range scan on tasks.remind_at, so the cost of a tick does
+not depend on how many reminders are pending overall.
+
+A fired reminder is cleared with a conditional UPDATE (remind_at must still
+hold the value we loaded), so several workers can run a scheduler against
+the same database without notifying twice, and reminders that were moved,
+completed or deleted after being loaded are skipped.
+
+Reminders created inside the current window are picked up by the next load,
+so `horizon` is also the worst-case delay for them.
+
+Completing a task clears its reminder, so the remind_at index only holds
+reminders that can still fire.
+"""
+
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from models import Tasks
+
+logger = logging.getLogger("taskapp.reminders")
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; they are stored in UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def log_reminder(task: Tasks) -> None:
+    logger.info("Reminder for task %s (owner %s): %s", task.id, task.owner_id, task.title)
+
+
+def clear_completed_reminders(db: Session) -> int:
+    """
+    Clears remind_at on completed tasks (from before completing cleared it).
+    Returns how many.
+    """
+    cleared = db.query(Tasks).filter(Tasks.remind_at.isnot(None))\
+        .filter(Tasks.complete == True)\
+        .update({Tasks.remind_at: None, Tasks.version: Tasks.version + 1},
+                synchronize_session=False)
+    db.commit()
+    return cleared
+
+
+class ReminderScheduler:
+
+    def __init__(self, session_factory: Callable[[], Session],
+                 notify: Callable[[Tasks], None] = log_reminder,
+                 horizon: timedelta = timedelta(minutes=1),
+                 batch_size: int = 1000):
+        self.session_factory = session_factory
+        self.notify = notify
+        self.horizon = horizon
+        self.batch_size = batch_size
+        # (remind_at as aware UTC, task id, remind_at exactly as loaded)
+        self._heap: List[Tuple[datetime, int, datetime]] = []
+        self._queued: Set[int] = set()
+        self._loaded_until: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def load(self, now: datetime) -> int:
+        """Loads the next window of pending reminders into the heap."""
+        window_end = now + self.horizon
+        db = self.session_factory()
+        try:
+            rows = db.query(Tasks.id, Tasks.remind_at)\
+                .filter(Tasks.remind_at.isnot(None))\
+                .filter(Tasks.remind_at < window_end)\
+                .filter(Tasks.complete == False)\
+                .order_by(Tasks.remind_at, Tasks.id)\
+                .limit(self.batch_size).all()
+        finally:
+            db.close()
+
+        added = 0
+        for task_id, remind_at in rows:
+            if task_id in self._queued:
+                continue
+            heapq.heappush(self._heap, (_as_utc(remind_at), task_id, remind_at))
+            self._queued.add(task_id)
+            added += 1
+
+        # A full batch means there may be more before window_end; only
+        # consider the window covered up to the last reminder we got.
+        if len(rows) == self.batch_size:
+            self._loaded_until = _as_utc(rows[-1][1])
+        else:
+            self._loaded_until = window_end
+        return added
+
+    def tick(self, now: Optional[datetime] = None) -> int:
+        """Fires every reminder that is due. Returns how many were sent."""
+        now = now or datetime.now(timezone.utc)
+        if self._loaded_until is None or now >= self._loaded_until:
+            self.load(now)
+
+        fired = 0
+        while self._heap and self._heap[0][0] <= now:
+            _, task_id, remind_at = heapq.heappop(self._heap)
+            self._queued.discard(task_id)
+            if self._fire(task_id, remind_at):
+                fired += 1
+        return fired
+
+    def _fire(self, task_id: int, remind_at: datetime) -> bool:
+        db = self.session_factory()
+        try:
+            claimed = db.query(Tasks).filter(Tasks.id == task_id)\
+                .filter(Tasks.remind_at == remind_at)\
+                .filter(Tasks.complete == False)\
+                .update({Tasks.remind_at: None, Tasks.version: Tasks.version + 1},
+                        synchronize_session=False)
+            db.commit()
+            if not claimed:
+                return False
+            task = db.query(Tasks).filter(Tasks.id == task_id).first()
+        finally:
+            db.close()
+
+        try:
+            self.notify(task)
+        except Exception:
+            logger.exception("Reminder notification failed for task %s", task_id)
+        return True
+
+    async def run(self, interval: float = 1.0) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.tick)
+            except Exception:
+                logger.exception("Reminder tick failed")
+            await asyncio.sleep(interval)
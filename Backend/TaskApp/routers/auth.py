@@ -1,48 +1,60 @@
-import os
-import bcrypt
-# --- FIX FOR PYTHON 3.12 & PASSLIB ---
-if not hasattr(bcrypt, "__about__"):
-    bcrypt.__about__ = type('about', (object,), {'__version__': bcrypt.__version__})
-# -------------------------------------
-
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Annotated, Optional, Union
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from jose import jwt, JWTError
-from passlib.context import CryptContext
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from config import Settings, get_app_settings
 from database import get_db
 from models import Users
 from schemas import CreateUserRequest, Token
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
 ALGORITHM = "HS256"
 
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+@lru_cache
+def get_bcrypt_context(rounds: int):
+    # passlib/bcrypt are only imported on first use to keep startup fast;
+    # rounds comes from the app's settings, one context per value
+    import bcrypt
+    # --- FIX FOR PYTHON 3.12 & PASSLIB ---
+    if not hasattr(bcrypt, "__about__"):
+        bcrypt.__about__ = type('about', (object,), {'__version__': bcrypt.__version__})
+    # -------------------------------------
+    from passlib.context import CryptContext
+    return CryptContext(schemes=['bcrypt'], deprecated='auto',
+                        bcrypt__rounds=rounds)
+
+settings_dependency = Annotated[Settings, Depends(get_app_settings)]
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl='auth/login')
 
-def authenticate_user(username: str, password: str, db: Session) -> Union[Users, bool]:
+def authenticate_user(username: str, password: str, db: Session,
+                      rounds: int) -> Union[Users, bool]:
     user = db.query(Users).filter(Users.username == username).first()
     if not user:
         return False
     # Cast to str to satisfy type checker
     hashed_pw: str = str(user.hashed_password)
-    if not bcrypt_context.verify(password, hashed_pw):
+    if not get_bcrypt_context(rounds).verify(password, hashed_pw):
         return False
     return user
 
-def create_access_token(username: str, user_id: int, expires_delta: timedelta) -> str:
+def create_access_token(username: str, user_id: int, expires_delta: timedelta,
+                        secret_key: str) -> str:
+    from jose import jwt
     encode = {'sub': username, 'id': user_id}
     expires = datetime.now(timezone.utc) + expires_delta
     encode.update({'exp': expires})
-    return jwt.encode(encode, SECRET_KEY, algorithm=ALGORITHM)
+    return jwt.encode(encode, secret_key, algorithm=ALGORITHM)
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]) -> dict:
+async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)],
+                           settings: settings_dependency) -> dict:
+    from jose import jwt, JWTError
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, settings.secret_key, algorithms=[ALGORITHM])
         username: Optional[str] = payload.get('sub')
         user_id: Optional[int] = payload.get('id')
         if username is None or user_id is None:
@@ -54,41 +66,45 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]) -> dic
                             detail='Could not validate user.')
 
 @router.post("/signup", status_code=status.HTTP_201_CREATED)
-async def create_user(db: Annotated[Session, Depends(get_db)], 
+async def create_user(db: Annotated[Session, Depends(get_db)], settings: settings_dependency,
                       create_user_request: CreateUserRequest):
-    # Check if user already exists
-    existing_user = db.query(Users).filter(
-        (Users.email == create_user_request.email) | 
-        (Users.username == create_user_request.username)
-    ).first()
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email or username already registered"
-        )
-    
+    # bcrypt is slow on purpose; keep it off the event loop
+    hashed_password = await run_in_threadpool(get_bcrypt_context(settings.bcrypt_rounds).hash,
+                                              create_user_request.password)
     create_user_model = Users(
         email=create_user_request.email,
         username=create_user_request.username,
-        hashed_password=bcrypt_context.hash(create_user_request.password),
+        hashed_password=hashed_password,
         is_active=True
     )
     db.add(create_user_model)
-    db.commit()
+    # No pre-check query: the unique indexes on email/username reject
+    # duplicates, including concurrent signups racing for the same name
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email or username already registered"
+        )
     return {"message": "User created successfully"}
 
 
 @router.post("/login", response_model=Token)
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-                                 db: Annotated[Session, Depends(get_db)]):
-    user = authenticate_user(form_data.username, form_data.password, db)
+                                 db: Annotated[Session, Depends(get_db)],
+                                 settings: settings_dependency):
+    user = await run_in_threadpool(authenticate_user, form_data.username,
+                                   form_data.password, db, settings.bcrypt_rounds)
     if not user or isinstance(user, bool):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, 
                             detail='Invalid username or password.')
     # Extract values to satisfy type checker
     username_val: str = getattr(user, 'username')
     user_id_val: int = getattr(user, 'id')
-    token = create_access_token(username_val, user_id_val, timedelta(minutes=20))
+    token = create_access_token(username_val, user_id_val, timedelta(minutes=20),
+                                 settings.secret_key)
     return {'access_token': token, 'token_type': 'bearer'}
 
 
@@ -0,0 +1,110 @@
+from typing import Annotated, Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, Path, status
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database import get_db
+from models import ProjectMembers, Projects, Users
+from schemas import MemberRequest, ProjectRequest
+from .auth import get_current_user
+
+router = APIRouter(prefix='/projects', tags=['projects'])
+
+db_dependency = Annotated[Session, Depends(get_db)]
+user_dependency = Annotated[dict, Depends(get_current_user)]
+
+EDIT_ROLES = ('owner', 'editor')
+
+def member_project_ids(user_id: int, roles=None):
+    # Subquery on the (user_id, project_id, role) index, for use in task filters
+    query = select(ProjectMembers.project_id).where(ProjectMembers.user_id == user_id)
+    if roles is not None:
+        query = query.where(ProjectMembers.role.in_(roles))
+    return query
+
+class ProjectAccess:
+    """
+    The current user's project roles, looked up at most once per project
+    for the lifetime of a request.
+    """
+
+    def __init__(self, db: Session, user_id: int):
+        self.db = db
+        self.user_id = user_id
+        self._roles: Dict[int, Optional[str]] = {}
+
+    def role(self, project_id: int) -> Optional[str]:
+        if project_id not in self._roles:
+            self._roles[project_id] = self.db.query(ProjectMembers.role)\
+                .filter(ProjectMembers.user_id == self.user_id)\
+                .filter(ProjectMembers.project_id == project_id).scalar()
+        return self._roles[project_id]
+
+    def require(self, project_id: int, roles=('owner', 'editor', 'viewer')) -> str:
+        role = self.role(project_id)
+        if role is None:
+            raise HTTPException(status_code=404, detail='Project not found.')
+        if role not in roles:
+            raise HTTPException(status_code=403, detail='Not allowed in this project.')
+        return role
+
+def get_project_access(user: user_dependency, db: db_dependency) -> ProjectAccess:
+    # FastAPI caches dependencies per request, so every dependant shares this one
+    return ProjectAccess(db, user.get('id'))
+
+access_dependency = Annotated[ProjectAccess, Depends(get_project_access)]
+
+@router.get("/", status_code=status.HTTP_200_OK)
+async def read_my_projects(user: user_dependency, db: db_dependency):
+    rows = db.query(Projects, ProjectMembers.role)\
+        .join(ProjectMembers, ProjectMembers.project_id == Projects.id)\
+        .filter(ProjectMembers.user_id == user.get('id'))\
+        .order_by(Projects.id).all()
+    return [{'id': project.id, 'name': project.name, 'owner_id': project.owner_id,
+             'role': role} for project, role in rows]
+
+@router.post("/", status_code=status.HTTP_201_CREATED)
+async def create_project(user: user_dependency, db: db_dependency,
+                         project_request: ProjectRequest):
+    project_model = Projects(name=project_request.name, owner_id=user.get('id'))
+    db.add(project_model)
+    db.flush()
+    db.add(ProjectMembers(project_id=project_model.id, user_id=user.get('id'), role='owner'))
+    db.commit()
+    return {'id': project_model.id, 'name': project_model.name,
+            'owner_id': project_model.owner_id, 'role': 'owner'}
+
+@router.put("/{project_id}/members", status_code=status.HTTP_204_NO_CONTENT)
+async def set_member(db: db_dependency, access: access_dependency,
+                     member_request: MemberRequest, project_id: int = Path(gt=0)):
+    access.require(project_id, roles=('owner',))
+    member = db.query(Users.id).filter(Users.username == member_request.username).first()
+    if member is None:
+        raise HTTPException(status_code=404, detail='User not found.')
+    if member.id == access.user_id:
+        raise HTTPException(status_code=400, detail='You cannot change your own role.')
+
+    updated = db.query(ProjectMembers).filter(ProjectMembers.project_id == project_id)\
+        .filter(ProjectMembers.user_id == member.id)\
+        .update({ProjectMembers.role: member_request.role})
+    if not updated:
+        db.add(ProjectMembers(project_id=project_id, user_id=member.id,
+                              role=member_request.role))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail='Membership changed concurrently.')
+
+@router.delete("/{project_id}/members/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def remove_member(db: db_dependency, access: access_dependency,
+                        project_id: int = Path(gt=0), user_id: int = Path(gt=0)):
+    access.require(project_id, roles=('owner',))
+    if user_id == access.user_id:
+        raise HTTPException(status_code=400, detail='You cannot remove yourself.')
+
+    removed = db.query(ProjectMembers).filter(ProjectMembers.project_id == project_id)\
+        .filter(ProjectMembers.user_id == user_id).delete()
+    if not removed:
+        raise HTTPException(status_code=404, detail='Member not found.')
+    db.commit()
@@ -1,50 +1,370 @@
-from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, Path, status
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, Optional, Tuple
+from fastapi import (APIRouter, BackgroundTasks, Depends, Header, HTTPException, Path,
+                     Query, Request, Response, status)
+from sqlalchemy import and_, case, delete, func, or_, update
 from sqlalchemy.orm import Session
-from database import get_db
-from models import Tasks
-from schemas import TaskRequest
+import idempotency
+from audit import AuditLog, latest_state, read_history, snapshot
+from config import Settings, get_app_settings
+from database import allocate_task_id, get_db, get_shard_db, is_sharded, task_session_for
+from models import ProjectMembers, TaskEvents, Tasks, TasksArchive
+from ordering import MAX_KEY_LENGTH, key_between, last_position, rebalance_positions
+from schemas import MoveRequest, TaskRequest
 from .auth import get_current_user
+from .projects import EDIT_ROLES, ProjectAccess, access_dependency, member_project_ids
 
 router = APIRouter(prefix='/tasks', tags=['tasks'])
 
-db_dependency = Annotated[Session, Depends(get_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
+def get_task_db(user: user_dependency, db: Annotated[Session, Depends(get_db)]):
+    # In sharded mode tasks live on the owner's shard, not the main database
+    if not is_sharded():
+        yield db
+        return
+    yield from get_shard_db(user.get('id'))
+
+db_dependency = Annotated[Session, Depends(get_task_db)]
+
+def get_audit_log(request: Request) -> Optional[AuditLog]:
+    # None when the app runs without its lifespan (e.g. plain TestClient)
+    return request.app.state.audit_log
+
+audit_dependency = Annotated[Optional[AuditLog], Depends(get_audit_log)]
+
+def make_etag(version: int) -> str:
+    return f'"{version}"'
+
+def parse_etag(value: Optional[str]) -> Optional[int]:
+    # Accepts "3", W/"3" or 3; '*' (any version) and missing headers give None
+    if value is None or value.strip() == '*':
+        return None
+    tag = value.strip()
+    if tag.startswith('W/'):
+        tag = tag[2:]
+    try:
+        return int(tag.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid ETag.')
+
+def visible_to(user_id: int):
+    # Own tasks plus tasks of the user's projects; each side is an index lookup.
+    # In sharded mode project_members is only in the main database, so only
+    # own tasks are visible.
+    if is_sharded():
+        return Tasks.owner_id == user_id
+    return or_(Tasks.owner_id == user_id,
+               Tasks.project_id.in_(member_project_ids(user_id)))
+
+def editable_by(user_id: int):
+    if is_sharded():
+        return Tasks.owner_id == user_id
+    return or_(Tasks.owner_id == user_id,
+               Tasks.project_id.in_(member_project_ids(user_id, EDIT_ROLES)))
+
+def raise_write_error(db: Session, task_id: int, user_id: int):
+    # Only reached when a write matched no row, so the happy path stays one query.
+    # One join tells apart missing, read-only and stale.
+    if is_sharded():
+        owner_id, role = db.query(Tasks.owner_id).filter(Tasks.id == task_id).scalar(), None
+    else:
+        row = db.query(Tasks.owner_id, ProjectMembers.role)\
+            .outerjoin(ProjectMembers, and_(ProjectMembers.project_id == Tasks.project_id,
+                                            ProjectMembers.user_id == user_id))\
+            .filter(Tasks.id == task_id).first()
+        owner_id, role = row if row is not None else (None, None)
+    if owner_id is None or (owner_id != user_id and role is None):
+        raise HTTPException(status_code=404, detail='Task not found.')
+    if owner_id != user_id and role not in EDIT_ROLES:
+        raise HTTPException(status_code=403, detail='Not allowed to modify this task.')
+    raise HTTPException(status_code=409, detail='Task was modified by another request.')
+
+def require_project(access: ProjectAccess, project_id: int, roles=('owner', 'editor', 'viewer')):
+    # Shards cannot see project_members, so shared tasks would be unreachable
+    # for the other members; projects are a single-database feature
+    if is_sharded():
+        raise HTTPException(status_code=400,
+                            detail='Projects are not available in sharded mode.')
+    access.require(project_id, roles)
+
+def rebalance_in_background(owner_id: int, project_id: Optional[int]):
+    db = task_session_for(owner_id)
+    try:
+        rebalance_positions(db, owner_id, project_id)
+    finally:
+        db.close()
+
+def list_of(row):
+    # Tasks in the same manual-order list share this key (see ordering.list_filter)
+    return ('project', row.project_id) if row.project_id is not None else ('owner', row.owner_id)
+
+def neighbour_positions(db: Session, user_id: int, task_id: int, move_request: MoveRequest):
+    """Positions of the neighbours, and the (owner_id, project_id) of the moved task's list."""
+    ids = {task_id, move_request.after_id, move_request.before_id} - {None}
+    rows = {row.id: row for row in
+            db.query(Tasks.id, Tasks.position, Tasks.owner_id, Tasks.project_id)
+            .filter(Tasks.id.in_(ids)).filter(visible_to(user_id))}
+    if len(rows) != len(ids):
+        raise HTTPException(status_code=404, detail='Task not found.')
+    if len({list_of(row) for row in rows.values()}) > 1:
+        raise HTTPException(status_code=400, detail='Tasks are in different lists.')
+    after = rows[move_request.after_id].position if move_request.after_id else None
+    before = rows[move_request.before_id].position if move_request.before_id else None
+    return after, before, (rows[task_id].owner_id, rows[task_id].project_id)
+
+def position_between(db: Session, user_id: int, task_id: int,
+                     move_request: MoveRequest) -> Tuple[str, bool]:
+    """
+    The moved task's new key, and whether its list had to be rebalanced
+    first. The rebalance is not committed: it stands or falls with the move.
+    """
+    after, before, task_list = neighbour_positions(db, user_id, task_id, move_request)
+    ids = (move_request.after_id, move_request.before_id)
+    rebalanced = bool((ids[0] and after is None) or (ids[1] and before is None)
+                      or (after is not None and after == before))
+    if rebalanced:
+        # Tasks from before manual ordering, or two tasks sharing a key
+        rebalance_positions(db, *task_list, commit=False)
+        after, before, task_list = neighbour_positions(db, user_id, task_id, move_request)
+    if after is not None and before is not None and after > before:
+        raise HTTPException(status_code=400, detail='after_id must come before before_id.')
+    try:
+        return key_between(after, before), rebalanced
+    except ValueError:
+        raise HTTPException(status_code=409, detail='Task order changed, reload the list.')
+
 @router.get("/", status_code=status.HTTP_200_OK)
-async def read_all_my_tasks(user: user_dependency, db: db_dependency):
-    return db.query(Tasks).filter(Tasks.owner_id == user.get('id')).all()
+async def read_all_my_tasks(user: user_dependency, db: db_dependency, access: access_dependency,
+                            project_id: Optional[int] = Query(default=None, gt=0),
+                            after_position: Optional[str] = Query(default=None),
+                            after_id: Optional[int] = Query(default=None, gt=0),
+                            limit: Optional[int] = Query(default=None, gt=0, le=500)):
+    # In manual order; page with after_position/after_id = the last task seen.
+    # Keys can repeat (concurrent creates), so the cursor includes the id.
+    if (after_position is None) != (after_id is None):
+        raise HTTPException(status_code=400, detail='Send after_position and after_id together.')
+    if project_id is not None:
+        require_project(access, project_id)
+        query = db.query(Tasks).filter(Tasks.project_id == project_id)
+    else:
+        query = db.query(Tasks).filter(visible_to(user.get('id')))
+    if after_position is not None:
+        query = query.filter(or_(Tasks.position > after_position,
+                                 and_(Tasks.position == after_position, Tasks.id > after_id)))
+    return query.order_by(Tasks.position, Tasks.id).limit(limit).all()
+
+@router.get("/due", status_code=status.HTTP_200_OK)
+async def read_tasks_due(user: user_dependency, db: db_dependency,
+                         within: timedelta = Query(default=timedelta(days=1))):
+    # Open tasks due before now + within (overdue ones included), soonest first.
+    # Own tasks are served by the (owner_id, complete, due_at) index.
+    due_before = datetime.now(timezone.utc) + within
+    return db.query(Tasks).filter(visible_to(user.get('id')))\
+        .filter(Tasks.complete == False)\
+        .filter(Tasks.due_at <= due_before)\
+        .order_by(Tasks.due_at).all()
+
+@router.get("/archive", status_code=status.HTTP_200_OK)
+async def read_archived_tasks(user: user_dependency, db: db_dependency,
+                              after_id: int = Query(default=0, ge=0),
+                              limit: int = Query(default=50, gt=0, le=200)):
+    # Archived (cold) tasks, paged by id: pass the last id seen as after_id
+    return db.query(TasksArchive).filter(TasksArchive.owner_id == user.get('id'))\
+        .filter(TasksArchive.id > after_id)\
+        .order_by(TasksArchive.id).limit(limit).all()
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
-async def create_task(user: user_dependency, db: db_dependency, task_request: TaskRequest):
+async def create_task(user: user_dependency, db: db_dependency, access: access_dependency,
+                      main_db: Annotated[Session, Depends(get_db)], audit_log: audit_dependency,
+                      settings: Annotated[Settings, Depends(get_app_settings)],
+                      task_request: TaskRequest,
+                      idempotency_key: Optional[str] = Header(default=None, max_length=255)):
+    if task_request.project_id is not None:
+        require_project(access, task_request.project_id, EDIT_ROLES)
+    if idempotency_key is not None:
+        # A retry of a request we already handled gets the original response
+        replay = idempotency.begin(db, user.get('id'), idempotency_key,
+                                   idempotency.fingerprint(task_request),
+                                   timedelta(hours=settings.idempotency_ttl_hours))
+        if replay is not None:
+            return replay
     task_model = Tasks(**task_request.model_dump(), owner_id=user.get('id'))
+    if is_sharded():
+        # Unique across shards, so the task can move shards keeping its id
+        task_model.id = allocate_task_id(main_db)
+    # New tasks go to the end of their list (the project's, or the owner's own)
+    task_model.position = key_between(
+        last_position(db, user.get('id'), task_request.project_id), None)
+    if task_model.complete:
+        task_model.completed_at = datetime.now(timezone.utc)
+        # A completed task has nothing to be reminded of
+        task_model.remind_at = None
     db.add(task_model)
+    db.flush()
+
+    created = {c.key: getattr(task_model, c.key) for c in Tasks.__table__.columns}
+    if idempotency_key is not None:
+        idempotency.finish(db, user.get('id'), idempotency_key,
+                           status.HTTP_201_CREATED, created)
     db.commit()
+    if audit_log is not None:
+        audit_log.record('create', task_model.id, user.get('id'), user.get('id'),
+                         snapshot(created))
+    return created
 
-@router.put("/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def update_task(user: user_dependency, db: db_dependency, 
-                      task_request: TaskRequest, task_id: int = Path(gt=0)):
+@router.get("/{task_id}", status_code=status.HTTP_200_OK)
+async def read_task(user: user_dependency, db: db_dependency, response: Response,
+                    task_id: int = Path(gt=0),
+                    if_none_match: Optional[str] = Header(default=None)):
     task_model = db.query(Tasks).filter(Tasks.id == task_id)\
-        .filter(Tasks.owner_id == user.get('id')).first()
-    
+        .filter(visible_to(user.get('id'))).first()
+
     if task_model is None:
         raise HTTPException(status_code=404, detail='Task not found.')
 
-    task_model.title = task_request.title
-    task_model.description = task_request.description
-    task_model.priority = task_request.priority
-    task_model.complete = task_request.complete
+    etag = make_etag(task_model.version)
+    if if_none_match is not None and parse_etag(if_none_match) == task_model.version:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    response.headers['ETag'] = etag
+    return task_model
 
-    db.add(task_model)
+@router.put("/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def update_task(user: user_dependency, db: db_dependency, response: Response,
+                      access: access_dependency, audit_log: audit_dependency,
+                      task_request: TaskRequest,
+                      task_id: int = Path(gt=0),
+                      if_match: Optional[str] = Header(default=None)):
+    # One UPDATE ... RETURNING; with If-Match it only applies to that version
+    expected_version = parse_etag(if_match)
+    if task_request.project_id is not None:
+        require_project(access, task_request.project_id, EDIT_ROLES)
+    stmt = update(Tasks).where(Tasks.id == task_id)\
+        .where(editable_by(user.get('id')))
+    if expected_version is not None:
+        stmt = stmt.where(Tasks.version == expected_version)
+
+    completed_at = func.coalesce(Tasks.completed_at, datetime.now(timezone.utc)) \
+        if task_request.complete else None
+    values = dict(
+        title=task_request.title,
+        description=task_request.description,
+        priority=task_request.priority,
+        complete=task_request.complete,
+        completed_at=completed_at,
+        version=Tasks.version + 1,
+    )
+    # Fields added after the first release are only changed when sent, so older
+    # clients don't clear a due date or unshare a task by omitting them
+    for field in ('due_at', 'remind_at', 'project_id'):
+        if field in task_request.model_fields_set:
+            values[field] = getattr(task_request, field)
+    if task_request.complete:
+        # Keeps completed tasks out of the reminder index
+        values['remind_at'] = None
+    if 'project_id' in task_request.model_fields_set:
+        # A task changing lists goes to the end of its new list. Leaving a
+        # project, the caller's own list stands in for the owner's.
+        appended = key_between(last_position(db, user.get('id'), task_request.project_id), None)
+        values['position'] = case(
+            (Tasks.project_id.is_distinct_from(task_request.project_id), appended),
+            else_=Tasks.position)
+    # Returning the whole row gives the audit snapshot without another read
+    stmt = stmt.values(**values).returning(*Tasks.__table__.columns)
+
+    row = db.execute(stmt).mappings().first()
+    if row is None:
+        db.rollback()
+        raise_write_error(db, task_id, user.get('id'))
     db.commit()
+    if audit_log is not None:
+        audit_log.record('update', task_id, row['owner_id'], user.get('id'), snapshot(row))
+    response.headers['ETag'] = make_etag(row['version'])
 
 @router.delete("/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_task(user: user_dependency, db: db_dependency, task_id: int = Path(gt=0)):
-    task_model = db.query(Tasks).filter(Tasks.id == task_id)\
-        .filter(Tasks.owner_id == user.get('id')).first()
-    
-    if task_model is None:
-        raise HTTPException(status_code=404, detail='Task not found.')
-    
-    db.query(Tasks).filter(Tasks.id == task_id).filter(Tasks.owner_id == user.get('id')).delete()
-    db.commit()
\ No newline at end of file
+async def delete_task(user: user_dependency, db: db_dependency, audit_log: audit_dependency,
+                      task_id: int = Path(gt=0),
+                      if_match: Optional[str] = Header(default=None)):
+    expected_version = parse_etag(if_match)
+    stmt = delete(Tasks).where(Tasks.id == task_id)\
+        .where(editable_by(user.get('id')))
+    if expected_version is not None:
+        stmt = stmt.where(Tasks.version == expected_version)
+
+    owner_id = db.execute(stmt.returning(Tasks.owner_id)).scalar()
+    if owner_id is None:
+        db.rollback()
+        raise_write_error(db, task_id, user.get('id'))
+    db.commit()
+    if audit_log is not None:
+        audit_log.record('delete', task_id, owner_id, user.get('id'), None)
+
+@router.post("/{task_id}/move", status_code=status.HTTP_200_OK)
+async def move_task(user: user_dependency, db: db_dependency, response: Response,
+                    audit_log: audit_dependency,
+                    background_tasks: BackgroundTasks, move_request: MoveRequest,
+                    task_id: int = Path(gt=0),
+                    if_match: Optional[str] = Header(default=None)):
+    if move_request.after_id is None and move_request.before_id is None:
+        raise HTTPException(status_code=400, detail='Give after_id, before_id or both.')
+    if task_id in (move_request.after_id, move_request.before_id):
+        raise HTTPException(status_code=400, detail='A task cannot move next to itself.')
+
+    expected_version = parse_etag(if_match)
+    # Nothing is written for a caller who may not move the task, or whose
+    # If-Match is already stale
+    version = db.query(Tasks.version).filter(Tasks.id == task_id)\
+        .filter(editable_by(user.get('id'))).scalar()
+    if version is None or (expected_version is not None and version != expected_version):
+        raise_write_error(db, task_id, user.get('id'))
+    position, rebalanced = position_between(db, user.get('id'), task_id, move_request)
+
+    # The move itself is a single-row UPDATE, in the same transaction as a
+    # rebalance, which bumped this task's version too
+    stmt = update(Tasks).where(Tasks.id == task_id)\
+        .where(editable_by(user.get('id')))
+    if expected_version is not None:
+        stmt = stmt.where(Tasks.version == expected_version + rebalanced)
+    stmt = stmt.values(position=position, version=Tasks.version + 1)\
+        .returning(*Tasks.__table__.columns)
+
+    row = db.execute(stmt).first()
+    if row is None:
+        db.rollback()
+        raise_write_error(db, task_id, user.get('id'))
+    db.commit()
+    if audit_log is not None:
+        audit_log.record('move', task_id, row.owner_id, user.get('id'), snapshot(row._mapping))
+
+    if len(position) > MAX_KEY_LENGTH:
+        background_tasks.add_task(rebalance_in_background, row.owner_id, row.project_id)
+    response.headers['ETag'] = make_etag(row.version)
+    return {'id': task_id, 'position': position, 'version': row.version}
+
+@router.get("/{task_id}/history", status_code=status.HTTP_200_OK)
+async def read_task_history(user: user_dependency, access: access_dependency,
+                            main_db: Annotated[Session, Depends(get_db)],
+                            audit_log: audit_dependency, task_id: int = Path(gt=0),
+                            before_id: Optional[int] = Query(default=None, gt=0),
+                            limit: int = Query(default=50, gt=0, le=200)):
+    # Newest first; page with before_id = last id seen. Events buffered by
+    # other workers show up after their next flush (AUDIT_FLUSH_SECONDS).
+    # Access comes from the events, not the task row, so the history of
+    # deleted and archived tasks stays readable: the owner's own, or that
+    # of a task whose last state was in one of the user's projects.
+    user_id = user.get('id')
+    # This worker's unflushed events are merged in memory, not written here
+    buffered = audit_log.pending(task_id) if audit_log is not None else []
+    owned = any(event['owner_id'] == user_id for event in buffered) or \
+        main_db.query(TaskEvents.id).filter(TaskEvents.task_id == task_id)\
+        .filter(TaskEvents.owner_id == user_id).first() is not None
+    if owned:
+        owner_id = user_id
+    else:
+        latest = latest_state(main_db, task_id, buffered)
+        project_id = latest[1].get('project_id') if latest is not None else None
+        if project_id is None or access.role(project_id) is None:
+            raise HTTPException(status_code=404, detail='Task not found.')
+        owner_id = latest[0]
+    pending = [event for event in buffered if event['owner_id'] == owner_id]
+    return read_history(main_db, task_id, owner_id, before_id, limit, pending)
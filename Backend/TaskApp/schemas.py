@@ -1,11 +1,38 @@
-from pydantic import BaseModel, Field, EmailStr
-from typing import Optional
+from datetime import datetime, timezone
+from pydantic import BaseModel, Field, EmailStr, field_validator
+from typing import Literal, Optional
 
 class TaskRequest(BaseModel):
     title: str = Field(min_length=3)
     description: str = Field(min_length=3)
     priority: int = Field(gt=0, lt=6)
     complete: bool = False
+    project_id: Optional[int] = Field(default=None, gt=0)
+    due_at: Optional[datetime] = None
+    remind_at: Optional[datetime] = None
+
+    @field_validator('due_at', 'remind_at')
+    @classmethod
+    def to_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        # Naive datetimes are taken as UTC; everything is stored in UTC
+        if value is None:
+            return value
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+
+class MoveRequest(BaseModel):
+    # The neighbours the task should end up between; leave one out to move
+    # the task to the start (after_id) or the end (before_id) of the list
+    after_id: Optional[int] = Field(default=None, gt=0)
+    before_id: Optional[int] = Field(default=None, gt=0)
+
+class ProjectRequest(BaseModel):
+    name: str = Field(min_length=3, max_length=100)
+
+class MemberRequest(BaseModel):
+    username: str
+    role: Literal['owner', 'editor', 'viewer']
 
 class CreateUserRequest(BaseModel):
     username: str = Field(min_length=3, max_length=50)
@@ -0,0 +1,75 @@
+import bisect
+import hashlib
+from typing import Dict, List, Sequence
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+
+def _hash(key: str) -> int:
+    return int(hashlib.md5(key.encode("utf-8")).hexdigest(), 16)
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping owner ids to shard names.
+
+    Every shard is placed on the ring `replicas` times, so adding a shard
+    only takes over roughly 1/N of the owners from the existing ones.
+    """
+
+    def __init__(self, nodes: Sequence[str] = (), replicas: int = 64):
+        self.replicas = replicas
+        self._keys: List[int] = []
+        self._nodes: Dict[int, str] = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str) -> None:
+        for i in range(self.replicas):
+            point = _hash(f"{node}#{i}")
+            bisect.insort(self._keys, point)
+            self._nodes[point] = node
+
+    def remove(self, node: str) -> None:
+        for i in range(self.replicas):
+            point = _hash(f"{node}#{i}")
+            self._keys.remove(point)
+            del self._nodes[point]
+
+    def get(self, key) -> str:
+        if not self._keys:
+            raise LookupError("Hash ring has no nodes.")
+        index = bisect.bisect(self._keys, _hash(str(key))) % len(self._keys)
+        return self._nodes[self._keys[index]]
+
+
+class ShardSet:
+    """
+    A set of named database engines with an owner_id -> shard resolver.
+
+    Shards are named by position ("shard0", "shard1", ...), so appending a
+    new URL to DATABASE_SHARD_URLS keeps the existing names stable.
+    """
+
+    def __init__(self, engines: Sequence[Engine]):
+        self.engines: Dict[str, Engine] = {
+            f"shard{i}": engine for i, engine in enumerate(engines)
+        }
+        self._sessionmakers = {
+            name: sessionmaker(autocommit=False, autoflush=False, bind=engine)
+            for name, engine in self.engines.items()
+        }
+        self.ring = HashRing(list(self.engines))
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.engines)
+
+    def shard_for(self, owner_id: int) -> str:
+        return self.ring.get(owner_id)
+
+    def session(self, name: str) -> Session:
+        return self._sessionmakers[name]()
+
+    def session_for(self, owner_id: int) -> Session:
+        return self.session(self.shard_for(owner_id))
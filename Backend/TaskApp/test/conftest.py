@@ -6,28 +6,34 @@ available to all test files. Pytest discovers this file automatically.
 
 KEY CONCEPTS:
 - Fixtures: Reusable setup code that provides data/objects to tests
-- Test Database: We use a separate SQLite database for testing (not PostgreSQL)
+- Test Database: We use a separate in-memory SQLite database for testing (not PostgreSQL)
+- Isolation: Tables are created once; each test runs in a rolled-back transaction
 - Dependency Override: We replace the real database with test database
 """
 
+import os
+
+# Cheap bcrypt cost in tests: hashing with the default 12 rounds dominates
+# the run time. Must be set before the settings are first read.
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
 from sqlalchemy.pool import StaticPool
 
 # Import our app and database components
 from main import app
 from database import Base, get_db
-from routers.auth import bcrypt_context
 
 # =============================================================================
 # TEST DATABASE SETUP
 # =============================================================================
-# We use SQLite in-memory database for tests (fast & isolated)
-# This means each test run starts with a fresh, empty database
+# We use a SQLite in-memory database for tests (fast & isolated).
+# It lives inside the test process, so every pytest-xdist worker gets its own.
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+SQLALCHEMY_DATABASE_URL = "sqlite://"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
@@ -35,33 +41,50 @@ engine = create_engine(
     poolclass=StaticPool,  # Use same connection for all threads
 )
 
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# pysqlite manages transactions itself and breaks SAVEPOINTs; take over so
+# each test can run inside a transaction that is rolled back afterwards.
+@event.listens_for(engine, "connect")
+def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+@event.listens_for(engine, "begin")
+def _emit_begin(connection):
+    connection.exec_driver_sql("BEGIN")
 
 
 # =============================================================================
 # FIXTURES
 # =============================================================================
 
-@pytest.fixture(scope="function")
-def test_db():
+@pytest.fixture(scope="session")
+def test_schema():
     """
-    Creates a fresh database for each test function.
-    
-    - Before test: Creates all tables
-    - After test: Drops all tables (cleanup)
-    
-    This ensures tests are isolated and don't affect each other.
+    Creates all tables once for the whole test session.
     """
-    # Create tables
     Base.metadata.create_all(bind=engine)
-    
-    db = TestingSessionLocal()
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture(scope="function")
+def test_db(test_schema):
+    """
+    Gives each test a session inside a transaction that is rolled back
+    when the test ends.
+
+    The app's db.commit() calls only release a SAVEPOINT, so nothing a
+    test writes is visible to the next one, without recreating tables.
+    """
+    connection = engine.connect()
+    transaction = connection.begin()
+    db = Session(bind=connection, autoflush=False,
+                 join_transaction_mode="create_savepoint")
     try:
         yield db
     finally:
         db.close()
-        # Drop all tables after test
-        Base.metadata.drop_all(bind=engine)
+        transaction.rollback()
+        connection.close()
 
 
 @pytest.fixture(scope="function")
@@ -0,0 +1,158 @@
+"""
+test_app.py - App Factory & CLI Tests
+
+Tests that building the app does no database work, that engines follow
+the app lifespan, and the `cli.py` initdb (including upgrades) and serve
+commands.
+
+HOW TO RUN:
+    pytest test/test_app.py -v
+"""
+
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import inspect
+
+import cli
+import database
+from config import Settings, get_settings
+from main import create_app
+
+
+class TestCreateApp:
+    """Tests for main.create_app()"""
+
+    def test_create_app_does_not_touch_database(self, tmp_path):
+        """
+        Test: Building the app must not create the database file.
+        """
+        db_file = tmp_path / "app.db"
+        create_app(Settings(database_url=f"sqlite:///{db_file}"))
+
+        assert not db_file.exists()
+
+    def test_lifespan_manages_engines(self, tmp_path):
+        """
+        Test: Engines exist while the app runs and are disposed on shutdown.
+        """
+        app = create_app(Settings(database_url=f"sqlite:///{tmp_path}/app.db"))
+
+        with TestClient(app) as client:
+            assert database.engine is not None
+            assert client.get("/tasks/").status_code == 401
+
+        assert database.engine is None
+
+    def test_settings_are_used(self):
+        """
+        Test: Settings passed to create_app are exposed on app.state.
+        """
+        settings = Settings(cors_origins=["https://tasks.example.com"])
+
+        assert create_app(settings).state.settings is settings
+
+
+class TestInitDb:
+    """Tests for `python cli.py initdb`"""
+
+    def test_initdb_creates_tables(self, tmp_path, monkeypatch):
+        """
+        Test: initdb creates the users and tasks tables.
+        """
+        db_url = f"sqlite:///{tmp_path}/init.db"
+        monkeypatch.setattr(cli, "get_settings", lambda: Settings(database_url=db_url))
+
+        cli.main(["initdb"])
+
+        engine = database.make_engine(db_url)
+        assert {"users", "tasks"} <= set(inspect(engine).get_table_names())
+        engine.dispose()
+
+    def test_initdb_upgrades_existing_tables(self, tmp_path, monkeypatch):
+        """
+        Test: initdb adds the columns and indexes a database created by the
+        first release is missing, keeping its rows and giving them a position.
+        """
+        db_url = f"sqlite:///{tmp_path}/old.db"
+        engine = database.make_engine(db_url)
+        with engine.begin() as connection:
+            connection.exec_driver_sql(
+                "CREATE TABLE tasks (id INTEGER PRIMARY KEY, title VARCHAR, "
+                "description VARCHAR, priority INTEGER, complete BOOLEAN, owner_id INTEGER)")
+            connection.exec_driver_sql(
+                "INSERT INTO tasks (title, priority, complete, owner_id) VALUES ('Old', 1, 0, 1)")
+        monkeypatch.setattr(cli, "get_settings", lambda: Settings(database_url=db_url))
+
+        cli.main(["initdb"])
+
+        inspector = inspect(engine)
+        columns = {column["name"] for column in inspector.get_columns("tasks")}
+        assert {"due_at", "remind_at", "completed_at", "version",
+                "project_id", "position"} <= columns
+        assert "ix_tasks_owner_complete_due" in \
+            {index["name"] for index in inspector.get_indexes("tasks")}
+        with engine.connect() as connection:
+            # Getting a position is a write, so version goes from 1 to 2
+            assert connection.exec_driver_sql(
+                "SELECT title, version, position FROM tasks").all() == [("Old", 2, "a0")]
+        engine.dispose()
+
+
+class TestServe:
+    """Tests for `python cli.py serve`"""
+
+    def test_pool_sizing_respects_budget(self):
+        """
+        Test: Per-worker pools never add up to more than the budget.
+        """
+        assert cli.pool_sizing(100, 8) == (12, 0)
+        assert cli.pool_sizing(8, 8) == (1, 0)
+
+    def test_pool_sizing_budget_too_small(self):
+        """
+        Test: A budget below one connection per worker is rejected.
+        """
+        with pytest.raises(ValueError):
+            cli.pool_sizing(3, 4)
+
+    @pytest.fixture
+    def uvicorn_calls(self, monkeypatch):
+        """Records uvicorn.run calls instead of serving; restores env and settings."""
+        import uvicorn
+        calls = []
+        monkeypatch.setattr(uvicorn, "run", lambda app, **options: calls.append((app, options)))
+        # Through monkeypatch so the environment is restored afterwards
+        monkeypatch.delenv("DB_POOL_SIZE", raising=False)
+        monkeypatch.delenv("DB_MAX_OVERFLOW", raising=False)
+        get_settings.cache_clear()
+        yield calls
+        get_settings.cache_clear()
+
+    def test_serve_configures_workers(self, uvicorn_calls):
+        """
+        Test: serve starts uvicorn with the worker count and recycling
+        options, and hands the pool size to the workers via the environment.
+        """
+        cli.main(["serve", "--workers", "4", "--db-connection-budget", "40",
+                  "--max-requests", "500"])
+
+        app, options = uvicorn_calls[0]
+        assert app == "main:app"
+        assert options["workers"] == 4
+        assert options["limit_max_requests"] == 500
+        assert os.environ["DB_POOL_SIZE"] == "10"
+        assert os.environ["DB_MAX_OVERFLOW"] == "0"
+
+    def test_serve_single_worker(self, uvicorn_calls):
+        """
+        Test: A single worker runs in-process: it is never recycled, and
+        the settings it loads have the budgeted pool size.
+        """
+        get_settings()
+        cli.main(["serve", "--workers", "1", "--db-connection-budget", "7"])
+
+        app, options = uvicorn_calls[0]
+        assert "limit_max_requests" not in options
+        assert get_settings().db_pool_size == 7
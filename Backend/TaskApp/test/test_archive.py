@@ -0,0 +1,144 @@
+"""
+test_archive.py - Task Archive Tests
+
+Tests for moving old completed tasks to tasks_archive (archive.py)
+and for paging through them with GET /tasks/archive.
+
+HOW TO RUN:
+    pytest test/test_archive.py -v
+"""
+
+import pytest
+from datetime import datetime, timedelta, timezone
+from fastapi import status
+
+from sqlalchemy import update
+
+from archive import archive_batch, archive_completed_tasks
+from models import Tasks, TasksArchive
+
+LATER = datetime.now(timezone.utc) + timedelta(days=60)
+
+
+def create_tasks(client, headers, count, complete):
+    for i in range(count):
+        client.post("/tasks/", headers=headers, json={
+            "title": f"{'Done' if complete else 'Open'} {i}",
+            "description": "Description",
+            "priority": 2,
+            "complete": complete
+        })
+
+
+class TestArchiveMover:
+    """Tests for archive_completed_tasks()"""
+
+    def test_moves_only_old_completed_tasks(self, client, auth_headers, test_db):
+        """
+        Test: Completed tasks past the cutoff move to the archive;
+        open and recently completed tasks stay hot.
+        """
+        create_tasks(client, auth_headers, 3, complete=True)
+        create_tasks(client, auth_headers, 2, complete=False)
+
+        assert archive_completed_tasks(test_db, timedelta(days=30)) == 0
+
+        moved = archive_completed_tasks(test_db, timedelta(days=30), now=LATER)
+
+        assert moved == 3
+        assert test_db.query(TasksArchive).count() == 3
+        assert [t.title for t in test_db.query(Tasks).order_by(Tasks.id)] == ["Open 0", "Open 1"]
+
+    def test_moves_in_batches(self, client, auth_headers, test_db):
+        """
+        Test: A batch size smaller than the backlog still archives everything.
+        """
+        create_tasks(client, auth_headers, 5, complete=True)
+
+        moved = archive_completed_tasks(test_db, timedelta(days=30), batch_size=2, now=LATER)
+
+        assert moved == 5
+        assert test_db.query(Tasks).count() == 0
+
+    def test_reopened_task_is_not_archived(self, client, auth_headers, test_db):
+        """
+        Test: Marking a task incomplete again clears completed_at.
+        """
+        create_tasks(client, auth_headers, 1, complete=True)
+        task = client.get("/tasks/", headers=auth_headers).json()[0]
+        client.put(f"/tasks/{task['id']}", headers=auth_headers, json={
+            "title": task["title"],
+            "description": task["description"],
+            "priority": task["priority"],
+            "complete": False
+        })
+
+        assert archive_completed_tasks(test_db, timedelta(days=30), now=LATER) == 0
+
+    def test_task_reopened_during_batch_stays(self, client, auth_headers, test_db,
+                                              monkeypatch):
+        """
+        Test: A task reopened after the batch picked its id is neither
+        archived nor deleted.
+        """
+        create_tasks(client, auth_headers, 2, complete=True)
+        reopened_id = client.get("/tasks/", headers=auth_headers).json()[0]["id"]
+        execute = test_db.execute
+        calls = []
+
+        def reopen_after_select(statement, *args, **kwargs):
+            result = execute(statement, *args, **kwargs)
+            if not calls:
+                # Another request reopens the task between the SELECT and the DELETE
+                execute(update(Tasks).where(Tasks.id == reopened_id)
+                        .values(complete=False, completed_at=None))
+            calls.append(statement)
+            return result
+
+        monkeypatch.setattr(test_db, "execute", reopen_after_select)
+
+        assert archive_batch(test_db, LATER, 10, LATER) == 1
+        assert [t.id for t in test_db.query(Tasks)] == [reopened_id]
+        assert reopened_id not in [t.id for t in test_db.query(TasksArchive)]
+
+
+class TestReadArchive:
+    """Tests for GET /tasks/archive endpoint"""
+
+    def test_archive_hidden_from_task_list(self, client, auth_headers, test_db):
+        """
+        Test: Archived tasks leave GET /tasks/ and show up in the archive,
+        keeping their ids.
+        """
+        create_tasks(client, auth_headers, 1, complete=True)
+        task_id = client.get("/tasks/", headers=auth_headers).json()[0]["id"]
+        archive_completed_tasks(test_db, timedelta(days=30), now=LATER)
+
+        assert client.get("/tasks/", headers=auth_headers).json() == []
+        archived = client.get("/tasks/archive", headers=auth_headers).json()
+        assert [t["id"] for t in archived] == [task_id]
+        assert archived[0]["archived_at"] is not None
+
+    def test_archive_pagination(self, client, auth_headers, test_db):
+        """
+        Test: after_id/limit page through the archive in id order.
+        """
+        create_tasks(client, auth_headers, 5, complete=True)
+        archive_completed_tasks(test_db, timedelta(days=30), now=LATER)
+
+        first = client.get("/tasks/archive?limit=3", headers=auth_headers).json()
+        second = client.get(f"/tasks/archive?limit=3&after_id={first[-1]['id']}",
+                            headers=auth_headers).json()
+
+        assert [t["title"] for t in first + second] == [f"Done {i}" for i in range(5)]
+        assert len(second) == 2
+
+    def test_archive_without_auth(self, client):
+        """
+        Test: Reading the archive without token should fail.
+
+        Expected: 401 Unauthorized
+        """
+        response = client.get("/tasks/archive")
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
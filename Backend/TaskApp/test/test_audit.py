@@ -0,0 +1,248 @@
+"""
+test_audit.py - Task Audit Log Tests
+
+Tests that task writes are recorded in the audit log, that
+GET /tasks/{id}/history returns diffs page by page, and that the
+buffer and the compaction job behave.
+
+HOW TO RUN:
+    pytest test/test_audit.py -v
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import status
+from sqlalchemy.orm import Session
+
+from audit import AuditLog, compact_events, read_history
+from main import app
+from models import TaskEvents
+
+TASK = {"title": "Buy milk", "description": "Two litres", "priority": 2}
+
+
+@pytest.fixture
+def audit_log(test_db):
+    """
+    An audit log writing into the test transaction, installed on the app.
+    """
+    log = AuditLog(lambda: Session(bind=test_db.bind, join_transaction_mode="create_savepoint"),
+                   max_batch=100)
+    app.state.audit_log = log
+    yield log
+    app.state.audit_log = None
+
+
+def create_task(client, auth_headers):
+    return client.post("/tasks/", json=TASK, headers=auth_headers).json()["id"]
+
+
+def login(client, username):
+    """Signs up a user and returns their auth headers."""
+    client.post("/auth/signup", json={"email": f"{username}@example.com", "username": username,
+                                      "password": "otherpass123"})
+    token = client.post("/auth/login", data={"username": username,
+                                             "password": "otherpass123"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+class TestHistory:
+    """Tests for GET /tasks/{task_id}/history"""
+
+    def test_history_shows_changes(self, client, auth_headers, audit_log):
+        """
+        Test: Each write shows up newest first with the fields it changed.
+        """
+        task_id = create_task(client, auth_headers)
+        client.put(f"/tasks/{task_id}", json={**TASK, "priority": 5}, headers=auth_headers)
+
+        history = client.get(f"/tasks/{task_id}/history", headers=auth_headers).json()
+
+        assert [event["action"] for event in history] == ["update", "create"]
+        assert history[0]["changes"] == {"priority": [2, 5]}
+        assert history[1]["changes"]["title"] == [None, "Buy milk"]
+
+    def test_history_is_paginated(self, client, auth_headers, audit_log):
+        """
+        Test: before_id continues where the previous page ended, and the
+        oldest event on a page still gets its diff.
+        """
+        task_id = create_task(client, auth_headers)
+        for priority in (3, 4, 5):
+            client.put(f"/tasks/{task_id}", json={**TASK, "priority": priority},
+                       headers=auth_headers)
+        audit_log.flush()
+
+        url = f"/tasks/{task_id}/history"
+        first = client.get(url, params={"limit": 2}, headers=auth_headers).json()
+        second = client.get(url, params={"limit": 2, "before_id": first[-1]["id"]},
+                            headers=auth_headers).json()
+
+        assert [event["changes"]["priority"] for event in first] == [[4, 5], [3, 4]]
+        assert [event["action"] for event in second] == ["update", "create"]
+        assert second[0]["changes"] == {"priority": [2, 3]}
+
+    def test_unflushed_events_are_merged(self, client, auth_headers, audit_log, test_db):
+        """
+        Test: Reading history doesn't flush; this worker's buffered events
+        are shown (without an id) on top of the stored ones.
+        """
+        task_id = create_task(client, auth_headers)
+        audit_log.flush()
+        client.put(f"/tasks/{task_id}", json={**TASK, "priority": 5}, headers=auth_headers)
+
+        history = client.get(f"/tasks/{task_id}/history", headers=auth_headers).json()
+
+        assert [(event["id"] is None, event["action"]) for event in history] == \
+            [(True, "update"), (False, "create")]
+        assert history[0]["changes"] == {"priority": [2, 5]}
+        assert test_db.query(TaskEvents).count() == 1
+
+    def test_pages_follow_ts_not_id(self, test_db):
+        """
+        Test: Events flushed by different workers get ids out of ts order;
+        paging still returns every event exactly once, newest first.
+        """
+        now = datetime.now(timezone.utc)
+        # Ids 1, 2 were flushed first but happened after ids 3, 4
+        for minutes in (3, 4, 1, 2):
+            test_db.add(TaskEvents(task_id=1, owner_id=1, actor_id=1, action="update",
+                                   snapshot=json.dumps({"priority": minutes}),
+                                   ts=now + timedelta(minutes=minutes)))
+        test_db.commit()
+        ids = [event.id for event in test_db.query(TaskEvents).order_by(TaskEvents.id)]
+
+        first = read_history(test_db, 1, 1, None, 2)
+        second = read_history(test_db, 1, 1, first[-1]["id"], 2)
+
+        assert [event["id"] for event in first + second] == [ids[1], ids[0], ids[3], ids[2]]
+        assert second[0]["changes"] == {"priority": [1, 2]}
+
+    def test_delete_is_recorded(self, client, auth_headers, audit_log, test_db):
+        """
+        Test: Deleting a task records a 'delete' event.
+        """
+        task_id = create_task(client, auth_headers)
+        client.delete(f"/tasks/{task_id}", headers=auth_headers)
+        audit_log.flush()
+
+        actions = [action for (action,) in test_db.query(TaskEvents.action)
+                   .filter(TaskEvents.task_id == task_id).order_by(TaskEvents.id)]
+        assert actions == ["create", "delete"]
+
+    def test_history_of_deleted_task(self, client, auth_headers, audit_log):
+        """
+        Test: History outlives the task: its owner can still read it after
+        deleting it.
+        """
+        task_id = create_task(client, auth_headers)
+        client.delete(f"/tasks/{task_id}", headers=auth_headers)
+        audit_log.flush()
+
+        response = client.get(f"/tasks/{task_id}/history", headers=auth_headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [event["action"] for event in response.json()] == ["delete", "create"]
+
+    def test_project_member_reads_deleted_task_history(self, client, auth_headers, audit_log):
+        """
+        Test: A member of the project a deleted task was in can read its
+        history; someone outside the project cannot.
+        """
+        project_id = client.post("/projects/", json={"name": "Team"},
+                                 headers=auth_headers).json()["id"]
+        task_id = client.post("/tasks/", json={**TASK, "project_id": project_id},
+                              headers=auth_headers).json()["id"]
+        client.delete(f"/tasks/{task_id}", headers=auth_headers)
+        member, outsider = (login(client, name) for name in ("member1", "outsider1"))
+        client.put(f"/projects/{project_id}/members", headers=auth_headers,
+                   json={"username": "member1", "role": "viewer"})
+
+        allowed = client.get(f"/tasks/{task_id}/history", headers=member)
+        refused = client.get(f"/tasks/{task_id}/history", headers=outsider)
+
+        assert [event["action"] for event in allowed.json()] == ["delete", "create"]
+        assert refused.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_history_of_other_users_task(self, client, auth_headers, audit_log):
+        """
+        Test: Another user's task has no visible history.
+
+        Expected: 404 Not Found
+        """
+        task_id = create_task(client, auth_headers)
+        response = client.get(f"/tasks/{task_id}/history", headers=login(client, "other"))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+class TestAuditBuffer:
+    """Tests for AuditLog batching"""
+
+    def test_events_wait_for_flush(self, audit_log, test_db):
+        """
+        Test: Recording an event does not write it until the buffer is flushed.
+        """
+        audit_log.record("create", 1, 1, 1, {"title": "a"})
+
+        assert test_db.query(TaskEvents).count() == 0
+        assert audit_log.flush() == 1
+        assert test_db.query(TaskEvents).count() == 1
+
+    def test_full_buffer_is_flushed(self, test_db):
+        """
+        Test: Reaching max_batch writes the whole batch at once.
+        """
+        log = AuditLog(lambda: Session(bind=test_db.bind, join_transaction_mode="create_savepoint"),
+                       max_batch=3)
+        for i in range(3):
+            log.record("update", 1, 1, 1, {"priority": i})
+
+        assert test_db.query(TaskEvents).count() == 3
+
+
+class TestCompaction:
+    """Tests for audit.compact_events()"""
+
+    def test_old_events_are_compacted(self, test_db):
+        """
+        Test: Old events are removed except the newest old state of a
+        task; events of deleted tasks go entirely, recent ones stay.
+        """
+        now = datetime.now(timezone.utc)
+        old = now - timedelta(days=100)
+        test_db.add_all([
+            TaskEvents(task_id=1, owner_id=1, actor_id=1, action="create", snapshot="{}", ts=old),
+            TaskEvents(task_id=1, owner_id=1, actor_id=1, action="update", snapshot="{}", ts=old),
+            TaskEvents(task_id=1, owner_id=1, actor_id=1, action="update", snapshot="{}", ts=now),
+            TaskEvents(task_id=2, owner_id=1, actor_id=1, action="create", snapshot="{}", ts=old),
+            TaskEvents(task_id=2, owner_id=1, actor_id=1, action="delete", snapshot=None, ts=old),
+        ])
+        test_db.commit()
+
+        deleted = compact_events(test_db, timedelta(days=90), batch_size=1, now=now)
+
+        assert deleted == 3
+        remaining = test_db.query(TaskEvents.task_id, TaskEvents.action)\
+            .order_by(TaskEvents.id).all()
+        assert remaining == [(1, "update"), (1, "update")]
+
+    def test_compaction_keeps_latest_by_ts(self, test_db):
+        """
+        Test: The old event kept as baseline is the latest one by ts, even
+        when an older one has the higher id.
+        """
+        now = datetime.now(timezone.utc)
+        test_db.add_all([
+            TaskEvents(task_id=1, owner_id=1, actor_id=1, action="update",
+                       snapshot='{"priority": 2}', ts=now - timedelta(days=100)),
+            TaskEvents(task_id=1, owner_id=1, actor_id=1, action="create",
+                       snapshot='{"priority": 1}', ts=now - timedelta(days=101)),
+        ])
+        test_db.commit()
+
+        assert compact_events(test_db, timedelta(days=90), now=now) == 1
+
+        assert test_db.query(TaskEvents.snapshot).scalar() == '{"priority": 2}'
@@ -11,8 +11,18 @@ WHAT -v DOES:
     Shows verbose output with each test name and result
 """
 
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from config import Settings
+from database import Base, get_db, make_engine
+from main import app, create_app
+from models import Users
 
 
 # =============================================================================
@@ -41,6 +51,24 @@ class TestSignup:
         assert response.json()["message"] == "User created successfully"
     
     
+    def test_signup_uses_app_bcrypt_rounds(self, test_db):
+        """
+        Test: Passwords are hashed with the rounds of the settings the app
+        was created with, not the process-wide ones.
+        """
+        custom_app = create_app(Settings(bcrypt_rounds=5))
+        custom_app.dependency_overrides[get_db] = lambda: test_db
+        client = TestClient(custom_app)
+
+        client.post("/auth/signup", json={"username": "rounds", "email": "rounds@example.com",
+                                          "password": "password123"})
+        login = client.post("/auth/login", data={"username": "rounds",
+                                                 "password": "password123"})
+
+        hashed = test_db.query(Users.hashed_password).filter(Users.username == "rounds").scalar()
+        assert hashed.startswith("$2b$05$")
+        assert login.status_code == status.HTTP_200_OK
+
     def test_signup_duplicate_email(self, client, test_user):
         """
         Test: Signing up with an existing email should fail.
@@ -221,3 +249,55 @@ class TestLogout:
         response = client.post("/auth/logout")
         
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+# =============================================================================
+# CONCURRENT SIGNUP TESTS
+# =============================================================================
+
+class TestConcurrentSignup:
+    """Signups racing for the same username/email"""
+
+    def test_exactly_one_winner(self, tmp_path):
+        """
+        Test: Many simultaneous signups for the same account.
+
+        Uses its own SQLite file and a fresh session per request, so the
+        requests really compete in the database.
+        Expected: exactly one 201 Created, every other request 400
+        """
+        engine = make_engine(f"sqlite:///{tmp_path}/signup.db")
+        Base.metadata.create_all(bind=engine)
+        SignupSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        def override_get_db():
+            db = SignupSession()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        start = threading.Barrier(8)
+
+        def signup(i):
+            client = TestClient(app)
+            start.wait()
+            return client.post("/auth/signup", json={
+                "username": "racer",
+                "email": "racer@example.com" if i % 2 else f"racer{i}@example.com",
+                "password": "password123"
+            }).status_code
+
+        try:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                codes = list(pool.map(signup, range(8)))
+        finally:
+            app.dependency_overrides.clear()
+
+        assert codes.count(status.HTTP_201_CREATED) == 1
+        assert codes.count(status.HTTP_400_BAD_REQUEST) == 7
+        db = SignupSession()
+        assert db.query(Users).count() == 1
+        db.close()
+        engine.dispose()
@@ -0,0 +1,136 @@
+"""
+test_idempotency.py - Idempotency-Key Tests
+
+Tests that retried POST /tasks/ requests carrying the same
+Idempotency-Key create the task only once.
+
+HOW TO RUN:
+    pytest test/test_idempotency.py -v
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, get_db, make_engine
+from idempotency import purge_expired
+from main import app
+from models import IdempotencyKeys, Tasks
+
+TASK = {"title": "Buy milk", "description": "Two litres", "priority": 2}
+
+
+class TestIdempotencyKey:
+    """Tests for the Idempotency-Key header on POST /tasks/"""
+
+    def test_create_returns_task(self, client, auth_headers):
+        """
+        Test: Creating a task returns it, so a replay has something to return.
+        """
+        response = client.post("/tasks/", json=TASK, headers=auth_headers)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.json()["title"] == "Buy milk"
+        assert response.json()["id"] > 0
+
+    def test_retry_is_replayed(self, client, auth_headers):
+        """
+        Test: Sending the same request twice with one key creates one task
+        and returns the same response both times.
+        """
+        headers = {**auth_headers, "Idempotency-Key": "abc-123"}
+
+        first = client.post("/tasks/", json=TASK, headers=headers)
+        second = client.post("/tasks/", json=TASK, headers=headers)
+
+        assert first.status_code == second.status_code == status.HTTP_201_CREATED
+        assert first.json() == second.json()
+        assert second.headers["Idempotent-Replayed"] == "true"
+        assert len(client.get("/tasks/", headers=auth_headers).json()) == 1
+
+    def test_different_keys_create_twice(self, client, auth_headers):
+        """
+        Test: Distinct keys are distinct requests.
+        """
+        client.post("/tasks/", json=TASK, headers={**auth_headers, "Idempotency-Key": "one"})
+        client.post("/tasks/", json=TASK, headers={**auth_headers, "Idempotency-Key": "two"})
+
+        assert len(client.get("/tasks/", headers=auth_headers).json()) == 2
+
+    def test_key_reused_with_other_body(self, client, auth_headers):
+        """
+        Test: Reusing a key for a different request is an error.
+
+        Expected: 422 Unprocessable Entity
+        """
+        headers = {**auth_headers, "Idempotency-Key": "abc-123"}
+        client.post("/tasks/", json=TASK, headers=headers)
+
+        response = client.post("/tasks/", json={**TASK, "title": "Buy bread"}, headers=headers)
+
+        assert response.status_code == 422
+
+    def test_expired_key_runs_again(self, client, auth_headers, test_db):
+        """
+        Test: After the TTL, the key is forgotten and purged.
+        """
+        headers = {**auth_headers, "Idempotency-Key": "abc-123"}
+        client.post("/tasks/", json=TASK, headers=headers)
+        test_db.query(IdempotencyKeys).update(
+            {IdempotencyKeys.created_at: datetime.now(timezone.utc) - timedelta(days=2)})
+        test_db.commit()
+
+        assert purge_expired(test_db, timedelta(hours=24)) == 1
+        client.post("/tasks/", json=TASK, headers=headers)
+        assert len(client.get("/tasks/", headers=auth_headers).json()) == 2
+
+    def test_concurrent_duplicates(self, tmp_path):
+        """
+        Test: The same request sent 8 times at once creates exactly one task,
+        and every caller gets that task back.
+
+        Uses its own SQLite file and a session per request, so the
+        requests really compete in the database.
+        """
+        engine = make_engine(f"sqlite:///{tmp_path}/idempotency.db")
+        Base.metadata.create_all(bind=engine)
+        RaceSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        def override_get_db():
+            db = RaceSession()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        try:
+            client = TestClient(app)
+            client.post("/auth/signup", json={
+                "username": "racer", "email": "racer@example.com", "password": "password123"
+            })
+            token = client.post("/auth/login", data={
+                "username": "racer", "password": "password123"
+            }).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": "same"}
+            start = threading.Barrier(8)
+
+            def create(_):
+                start.wait()
+                return TestClient(app).post("/tasks/", json=TASK, headers=headers)
+
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                responses = list(pool.map(create, range(8)))
+        finally:
+            app.dependency_overrides.clear()
+
+        assert all(r.status_code == status.HTTP_201_CREATED for r in responses)
+        assert len({r.json()["id"] for r in responses}) == 1
+        db = RaceSession()
+        assert db.query(Tasks).count() == 1
+        db.close()
+        engine.dispose()
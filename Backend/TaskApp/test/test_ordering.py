@@ -0,0 +1,408 @@
+"""
+test_ordering.py - Manual Task Order Tests
+
+Tests for fractional order keys (ordering.py), the
+POST /tasks/{task_id}/move endpoint and per-list (project) ordering.
+
+HOW TO RUN:
+    pytest test/test_ordering.py -v
+"""
+
+import random
+
+import pytest
+from fastapi import status
+
+import routers.tasks
+from models import Tasks
+from ordering import backfill_positions, key_between, rebalance_positions, sequential_keys
+
+
+def create_tasks(client, headers, *titles):
+    for title in titles:
+        client.post("/tasks/", headers=headers, json={
+            "title": title, "description": "Description", "priority": 1
+        })
+    return {t["title"]: t["id"] for t in client.get("/tasks/", headers=headers).json()}
+
+
+def titles(client, headers):
+    return [t["title"] for t in client.get("/tasks/", headers=headers).json()]
+
+
+# =============================================================================
+# ORDER KEY TESTS
+# =============================================================================
+
+class TestOrderKeys:
+    """Tests for key_between()"""
+
+    def test_random_inserts_stay_sorted(self):
+        """
+        Test: Inserting at random places always yields a key strictly
+        between the neighbours.
+        """
+        rng = random.Random(0)
+        keys = []
+        for _ in range(2000):
+            i = rng.randint(0, len(keys))
+            before = keys[i - 1] if i > 0 else None
+            after = keys[i] if i < len(keys) else None
+            keys.insert(i, key_between(before, after))
+
+        assert keys == sorted(keys)
+        assert len(set(keys)) == len(keys)
+
+    def test_append_and_prepend_stay_short(self):
+        """
+        Test: Adding to either end of a long list keeps keys short.
+        """
+        keys = sequential_keys(5000)
+        first = None
+        for _ in range(5000):
+            first = key_between(None, first)
+
+        assert max(len(k) for k in keys) <= 4
+        assert len(first) <= 4
+
+    def test_rejects_unordered_neighbours(self):
+        """
+        Test: Asking for a key between b and a (b > a) fails.
+        """
+        with pytest.raises(ValueError):
+            key_between("a1", "a0")
+
+
+# =============================================================================
+# MOVE ENDPOINT TESTS
+# =============================================================================
+
+class TestMoveTask:
+    """Tests for POST /tasks/{task_id}/move endpoint"""
+
+    def test_new_tasks_are_appended(self, client, auth_headers):
+        """
+        Test: Tasks are listed in creation order by default.
+        """
+        create_tasks(client, auth_headers, "One", "Two", "Three")
+
+        assert titles(client, auth_headers) == ["One", "Two", "Three"]
+
+    def test_move_between(self, client, auth_headers, test_db):
+        """
+        Test: Moving a task between two others changes only its own row.
+        """
+        ids = create_tasks(client, auth_headers, "One", "Two", "Three")
+        before = {t.id: t.position for t in test_db.query(Tasks)}
+
+        response = client.post(f"/tasks/{ids['Three']}/move", headers=auth_headers,
+                               json={"after_id": ids["One"], "before_id": ids["Two"]})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert titles(client, auth_headers) == ["One", "Three", "Two"]
+        test_db.expire_all()
+        after = {t.id: t.position for t in test_db.query(Tasks)}
+        assert [i for i in after if after[i] != before[i]] == [ids["Three"]]
+
+    def test_move_to_start_and_end(self, client, auth_headers):
+        """
+        Test: Only before_id moves to the top, only after_id to the bottom.
+        """
+        ids = create_tasks(client, auth_headers, "One", "Two", "Three")
+
+        client.post(f"/tasks/{ids['Three']}/move", headers=auth_headers,
+                    json={"before_id": ids["One"]})
+        assert titles(client, auth_headers) == ["Three", "One", "Two"]
+
+        client.post(f"/tasks/{ids['Three']}/move", headers=auth_headers,
+                    json={"after_id": ids["Two"]})
+        assert titles(client, auth_headers) == ["One", "Two", "Three"]
+
+    def test_move_bumps_version(self, client, auth_headers):
+        """
+        Test: A move is a write: it returns the new version, and a stale
+        If-Match is rejected.
+        """
+        ids = create_tasks(client, auth_headers, "One", "Two")
+
+        response = client.post(f"/tasks/{ids['One']}/move", headers=auth_headers,
+                               json={"after_id": ids["Two"]})
+        stale = client.post(f"/tasks/{ids['One']}/move",
+                            headers={**auth_headers, "If-Match": '"1"'},
+                            json={"before_id": ids["Two"]})
+
+        assert response.json()["version"] == 2
+        assert stale.status_code == status.HTTP_409_CONFLICT
+
+    def test_move_needs_a_neighbour(self, client, auth_headers, test_task):
+        """
+        Test: A move without after_id or before_id is rejected.
+
+        Expected: 400 Bad Request
+        """
+        response = client.post(f"/tasks/{test_task['id']}/move", headers=auth_headers, json={})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_move_next_to_unknown_task(self, client, auth_headers, test_task):
+        """
+        Test: Neighbours must exist and be visible.
+
+        Expected: 404 Not Found
+        """
+        response = client.post(f"/tasks/{test_task['id']}/move", headers=auth_headers,
+                               json={"after_id": 99999})
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_move_with_neighbours_swapped(self, client, auth_headers, test_db):
+        """
+        Test: after_id placed after before_id is a client error, not a
+        reason to rewrite the list.
+
+        Expected: 400 Bad Request
+        """
+        ids = create_tasks(client, auth_headers, "One", "Two", "Three")
+
+        response = client.post(f"/tasks/{ids['Three']}/move", headers=auth_headers,
+                               json={"after_id": ids["Two"], "before_id": ids["One"]})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert {t.version for t in test_db.query(Tasks)} == {1}
+
+    def test_shared_keys_rebalance_with_the_move(self, client, auth_headers, test_db):
+        """
+        Test: Neighbours sharing a key are rebalanced in the move's
+        transaction; a stale If-Match leaves the list untouched, the
+        current one moves the task.
+        """
+        ids = create_tasks(client, auth_headers, "One", "Two", "Three")
+        test_db.query(Tasks).update({Tasks.position: "a0"})
+        test_db.commit()
+        url = f"/tasks/{ids['Three']}/move"
+        body = {"after_id": ids["One"], "before_id": ids["Two"]}
+
+        stale = client.post(url, headers={**auth_headers, "If-Match": '"7"'}, json=body)
+        test_db.expire_all()
+        unchanged = {(t.position, t.version) for t in test_db.query(Tasks)}
+        moved = client.post(url, headers={**auth_headers, "If-Match": '"1"'}, json=body)
+
+        assert stale.status_code == status.HTTP_409_CONFLICT
+        assert unchanged == {("a0", 1)}
+        assert moved.status_code == status.HTTP_200_OK
+        assert titles(client, auth_headers) == ["One", "Three", "Two"]
+
+    def test_long_keys_schedule_rebalance(self, client, auth_headers, monkeypatch):
+        """
+        Test: Repeatedly moving into the same gap grows the key until a
+        background rebalance is scheduled.
+        """
+        scheduled = []
+        monkeypatch.setattr(routers.tasks, "rebalance_in_background",
+                            lambda *task_list: scheduled.append(task_list))
+        ids = create_tasks(client, auth_headers, "One", "Two", "Three")
+
+        # Keep moving the task after One in front of the other one
+        for i in range(400):
+            moving, neighbour = ("Three", "Two") if i % 2 == 0 else ("Two", "Three")
+            client.post(f"/tasks/{ids[moving]}/move", headers=auth_headers,
+                        json={"after_id": ids["One"], "before_id": ids[neighbour]})
+            if scheduled:
+                break
+
+        assert scheduled
+
+
+class TestListPaging:
+    """Tests for paging GET /tasks/ with after_position/after_id"""
+
+    def test_pages_cover_tasks_sharing_a_key(self, client, auth_headers, test_db):
+        """
+        Test: Tasks with the same position are neither skipped nor repeated
+        at a page boundary.
+        """
+        ids = create_tasks(client, auth_headers, "One", "Two", "Three", "Four")
+        # Concurrent creates can end up with the same key
+        test_db.query(Tasks).filter(Tasks.id.in_([ids["Two"], ids["Three"]]))\
+            .update({Tasks.position: "a1"})
+        test_db.commit()
+
+        seen, params = [], {"limit": 2}
+        while True:
+            page = client.get("/tasks/", params=params, headers=auth_headers).json()
+            if not page:
+                break
+            seen += [t["title"] for t in page]
+            params = {"limit": 2, "after_position": page[-1]["position"],
+                      "after_id": page[-1]["id"]}
+
+        assert seen == ["One", "Two", "Three", "Four"]
+
+    def test_cursor_needs_both_parts(self, client, auth_headers):
+        """
+        Test: after_position without after_id is rejected.
+
+        Expected: 400 Bad Request
+        """
+        response = client.get("/tasks/", params={"after_position": "a0"}, headers=auth_headers)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class TestRebalancePositions:
+    """Tests for rebalance_positions()"""
+
+    def test_rebalance_keeps_order(self, client, auth_headers, test_db):
+        """
+        Test: Rebalancing rewrites keys short without changing the order,
+        and tasks without a position go last.
+        """
+        ids = create_tasks(client, auth_headers, "One", "Two", "Three")
+        client.post(f"/tasks/{ids['One']}/move", headers=auth_headers,
+                    json={"after_id": ids["Three"]})
+        test_db.query(Tasks).filter(Tasks.id == ids["Two"]).update({Tasks.position: None})
+        test_db.commit()
+        owner_id = test_db.query(Tasks).first().owner_id
+
+        assert rebalance_positions(test_db, owner_id) == 3
+
+        assert titles(client, auth_headers) == ["Three", "One", "Two"]
+        assert all(len(t.position) == 2 for t in test_db.query(Tasks))
+
+    def test_backfill_positions(self, client, auth_headers, test_db):
+        """
+        Test: Tasks without a position get one at the end of their list.
+        """
+        ids = create_tasks(client, auth_headers, "One", "Two", "Three")
+        test_db.query(Tasks).filter(Tasks.id.in_([ids["One"], ids["Three"]]))\
+            .update({Tasks.position: None})
+        test_db.commit()
+
+        assert backfill_positions(test_db) == 1
+
+        assert test_db.query(Tasks).filter(Tasks.position.is_(None)).count() == 0
+        assert titles(client, auth_headers) == ["Two", "One", "Three"]
+
+
+class TestProjectOrder:
+    """Tests for manual order in shared project lists"""
+
+    @pytest.fixture
+    def project_id(self, client, auth_headers):
+        return client.post("/projects/", json={"name": "Team"}, headers=auth_headers).json()["id"]
+
+    @pytest.fixture
+    def editor_headers(self, client, auth_headers, project_id):
+        client.post("/auth/signup", json={"username": "editor1", "email": "editor1@example.com",
+                                          "password": "password123"})
+        token = client.post("/auth/login", data={"username": "editor1",
+                                                 "password": "password123"}).json()["access_token"]
+        client.put(f"/projects/{project_id}/members", headers=auth_headers,
+                   json={"username": "editor1", "role": "editor"})
+        return {"Authorization": f"Bearer {token}"}
+
+    def project_titles(self, client, headers, project_id):
+        return [t["title"] for t in client.get("/tasks/", params={"project_id": project_id},
+                                               headers=headers).json()]
+
+    def test_tasks_append_to_project_list(self, client, auth_headers, editor_headers,
+                                          project_id):
+        """
+        Test: New project tasks go after the project's last task, whoever
+        created it.
+        """
+        for title, headers in (("One", auth_headers), ("Two", editor_headers),
+                               ("Three", auth_headers)):
+            client.post("/tasks/", headers=headers, json={
+                "title": title, "description": "Description", "priority": 1,
+                "project_id": project_id
+            })
+
+        assert self.project_titles(client, auth_headers, project_id) == ["One", "Two", "Three"]
+
+    def test_rebalance_keeps_project_order(self, client, auth_headers, editor_headers,
+                                           project_id, test_db):
+        """
+        Test: Rebalancing a project list keeps the order across owners and
+        leaves the owners' personal lists alone.
+        """
+        for title, headers in (("One", auth_headers), ("Two", editor_headers),
+                               ("Three", auth_headers)):
+            client.post("/tasks/", headers=headers, json={
+                "title": title, "description": "Description", "priority": 1,
+                "project_id": project_id
+            })
+        create_tasks(client, auth_headers, "Mine")
+        mine = test_db.query(Tasks).filter(Tasks.title == "Mine").one()
+        mine_position = mine.position
+
+        assert rebalance_positions(test_db, mine.owner_id, project_id) == 3
+
+        assert self.project_titles(client, auth_headers, project_id) == ["One", "Two", "Three"]
+        test_db.expire_all()
+        assert test_db.query(Tasks.position).filter(Tasks.title == "Mine").scalar() == mine_position
+
+    def test_viewer_cannot_move(self, client, auth_headers, project_id, test_db):
+        """
+        Test: A viewer's move is refused before anything is written, even
+        when the list would need a rebalance.
+
+        Expected: 403 Forbidden
+        """
+        shared = [client.post("/tasks/", headers=auth_headers, json={
+            "title": title, "description": "Description", "priority": 1,
+            "project_id": project_id
+        }).json()["id"] for title in ("One", "Two")]
+        test_db.query(Tasks).update({Tasks.position: None})
+        test_db.commit()
+        client.post("/auth/signup", json={"username": "viewer1", "email": "viewer1@example.com",
+                                          "password": "password123"})
+        token = client.post("/auth/login", data={"username": "viewer1",
+                                                 "password": "password123"}).json()["access_token"]
+        client.put(f"/projects/{project_id}/members", headers=auth_headers,
+                   json={"username": "viewer1", "role": "viewer"})
+
+        response = client.post(f"/tasks/{shared[0]}/move",
+                               headers={"Authorization": f"Bearer {token}"},
+                               json={"after_id": shared[1]})
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        test_db.expire_all()
+        assert {(t.position, t.version) for t in test_db.query(Tasks)} == {(None, 1)}
+
+    def test_move_across_lists(self, client, auth_headers, project_id):
+        """
+        Test: A task cannot be placed next to a task of another list.
+
+        Expected: 400 Bad Request
+        """
+        ids = create_tasks(client, auth_headers, "Mine")
+        shared = client.post("/tasks/", headers=auth_headers, json={
+            "title": "Shared", "description": "Description", "priority": 1,
+            "project_id": project_id
+        }).json()["id"]
+
+        response = client.post(f"/tasks/{ids['Mine']}/move", headers=auth_headers,
+                               json={"after_id": shared})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_task_joining_project_goes_last(self, client, auth_headers, project_id):
+        """
+        Test: Moving a task into a project appends it to the project list.
+        """
+        ids = create_tasks(client, auth_headers, "Mine")
+        for title in ("Shared 1", "Shared 2"):
+            client.post("/tasks/", headers=auth_headers, json={
+                "title": title, "description": "Description", "priority": 1,
+                "project_id": project_id
+            })
+
+        client.put(f"/tasks/{ids['Mine']}", headers=auth_headers, json={
+            "title": "Mine", "description": "Description", "priority": 1,
+            "project_id": project_id
+        })
+
+        assert self.project_titles(client, auth_headers, project_id) == \
+            ["Shared 1", "Shared 2", "Mine"]
+
@@ -0,0 +1,185 @@
+"""
+test_projects.py - Shared Project Tests
+
+Tests for projects, memberships (owner/editor/viewer) and how they
+change which tasks a user can see and modify.
+
+HOW TO RUN:
+    pytest test/test_projects.py -v
+"""
+
+import pytest
+from fastapi import status
+
+
+def login_as(client, username):
+    """Signs up and logs in another user, returning their auth headers."""
+    client.post("/auth/signup", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": "password123"
+    })
+    response = client.post("/auth/login", data={"username": username, "password": "password123"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def task_data(title, project_id=None):
+    data = {"title": title, "description": "Description", "priority": 3, "complete": False}
+    if project_id is not None:
+        data["project_id"] = project_id
+    return data
+
+
+@pytest.fixture
+def project(client, auth_headers):
+    """A project owned by the default test user."""
+    return client.post("/projects/", json={"name": "Team"}, headers=auth_headers).json()
+
+
+@pytest.fixture
+def member_headers(client, auth_headers, project):
+    """Returns a factory adding a new user to `project` with the given role."""
+    def add(username, role):
+        headers = login_as(client, username)
+        response = client.put(f"/projects/{project['id']}/members",
+                              json={"username": username, "role": role},
+                              headers=auth_headers)
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        return headers
+    return add
+
+
+# =============================================================================
+# PROJECT TESTS
+# =============================================================================
+
+class TestProjects:
+    """Tests for /projects/ endpoints"""
+
+    def test_create_project(self, client, auth_headers, project):
+        """
+        Test: The creator owns the project and sees it in their list.
+        """
+        assert project["role"] == "owner"
+        projects = client.get("/projects/", headers=auth_headers).json()
+        assert [(p["name"], p["role"]) for p in projects] == [("Team", "owner")]
+
+    def test_member_sees_project(self, client, project, member_headers):
+        """
+        Test: Added members see the project with their role.
+        """
+        headers = member_headers("viewer1", "viewer")
+
+        projects = client.get("/projects/", headers=headers).json()
+        assert [(p["id"], p["role"]) for p in projects] == [(project["id"], "viewer")]
+
+    def test_only_owner_manages_members(self, client, project, member_headers):
+        """
+        Test: Editors cannot add members.
+
+        Expected: 403 Forbidden
+        """
+        headers = member_headers("editor1", "editor")
+        login_as(client, "someone")
+
+        response = client.put(f"/projects/{project['id']}/members",
+                              json={"username": "someone", "role": "viewer"},
+                              headers=headers)
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_non_member_gets_404(self, client, project):
+        """
+        Test: Projects you are not in look like they don't exist.
+
+        Expected: 404 Not Found
+        """
+        headers = login_as(client, "outsider")
+
+        response = client.get(f"/tasks/?project_id={project['id']}", headers=headers)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+# =============================================================================
+# SHARED TASK TESTS
+# =============================================================================
+
+class TestSharedTasks:
+    """Tests for tasks that belong to a project"""
+
+    def test_members_see_project_tasks(self, client, auth_headers, project, member_headers):
+        """
+        Test: A viewer sees the project's tasks next to their own,
+        but not the owner's private tasks.
+        """
+        headers = member_headers("viewer1", "viewer")
+        client.post("/tasks/", json=task_data("Shared", project["id"]), headers=auth_headers)
+        client.post("/tasks/", json=task_data("Private"), headers=auth_headers)
+        client.post("/tasks/", json=task_data("Viewer's own"), headers=headers)
+
+        titles = {t["title"] for t in client.get("/tasks/", headers=headers).json()}
+        assert titles == {"Shared", "Viewer's own"}
+
+        in_project = client.get(f"/tasks/?project_id={project['id']}", headers=headers).json()
+        assert [t["title"] for t in in_project] == ["Shared"]
+
+    def test_viewer_cannot_modify(self, client, auth_headers, project, member_headers):
+        """
+        Test: Viewers can read but not update, delete or add project tasks.
+
+        Expected: 403 Forbidden
+        """
+        headers = member_headers("viewer1", "viewer")
+        client.post("/tasks/", json=task_data("Shared", project["id"]), headers=auth_headers)
+        task_id = client.get("/tasks/", headers=headers).json()[0]["id"]
+
+        assert client.get(f"/tasks/{task_id}", headers=headers).status_code == status.HTTP_200_OK
+        assert client.put(f"/tasks/{task_id}", json=task_data("Changed"),
+                          headers=headers).status_code == status.HTTP_403_FORBIDDEN
+        assert client.delete(f"/tasks/{task_id}",
+                             headers=headers).status_code == status.HTTP_403_FORBIDDEN
+        assert client.post("/tasks/", json=task_data("New", project["id"]),
+                           headers=headers).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_editor_can_modify(self, client, auth_headers, project, member_headers):
+        """
+        Test: Editors can update project tasks; leaving out project_id
+        keeps the task in the project.
+        """
+        headers = member_headers("editor1", "editor")
+        client.post("/tasks/", json=task_data("Shared", project["id"]), headers=auth_headers)
+        task_id = client.get("/tasks/", headers=headers).json()[0]["id"]
+
+        response = client.put(f"/tasks/{task_id}", json=task_data("Edited"), headers=headers)
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        task = client.get(f"/tasks/{task_id}", headers=auth_headers).json()
+        assert (task["title"], task["project_id"]) == ("Edited", project["id"])
+
+    def test_removed_member_loses_access(self, client, auth_headers, project, member_headers):
+        """
+        Test: After removal, the project's tasks disappear for the member.
+        """
+        headers = member_headers("editor1", "editor")
+        client.post("/tasks/", json=task_data("Shared", project["id"]), headers=auth_headers)
+        client.post("/tasks/", json=task_data("Mine"), headers=headers)
+        mine = next(t for t in client.get("/tasks/", headers=headers).json() if t["title"] == "Mine")
+
+        response = client.delete(f"/projects/{project['id']}/members/{mine['owner_id']}",
+                                 headers=auth_headers)
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert [t["title"] for t in client.get("/tasks/", headers=headers).json()] == ["Mine"]
+
+    def test_cannot_add_task_to_foreign_project(self, client, project):
+        """
+        Test: Creating a task in a project you are not in fails.
+
+        Expected: 404 Not Found
+        """
+        headers = login_as(client, "outsider")
+
+        response = client.post("/tasks/", json=task_data("Sneaky", project["id"]), headers=headers)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
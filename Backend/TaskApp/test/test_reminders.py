@@ -0,0 +1,142 @@
+"""
+test_reminders.py - Reminder Scheduler Tests
+
+Tests for the heap-based reminder scheduler in reminders.py.
+Uses its own SQLite file so the scheduler can open sessions freely.
+
+HOW TO RUN:
+    pytest test/test_reminders.py -v
+"""
+
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, make_engine
+from models import Tasks
+from reminders import ReminderScheduler, clear_completed_reminders
+
+NOW = datetime(2030, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path}/reminders.db")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+def add_task(session_factory, title, remind_at, complete=False):
+    db = session_factory()
+    task = Tasks(title=title, description="Description", priority=1,
+                 owner_id=1, remind_at=remind_at, complete=complete)
+    db.add(task)
+    db.commit()
+    task_id = task.id
+    db.close()
+    return task_id
+
+
+class TestReminderScheduler:
+    """Tests for ReminderScheduler.tick()"""
+
+    def test_fires_due_reminders_in_order(self, session_factory):
+        """
+        Test: Due reminders fire once, in remind_at order; later ones wait.
+        """
+        add_task(session_factory, "Second", NOW - timedelta(seconds=10))
+        add_task(session_factory, "First", NOW - timedelta(seconds=30))
+        add_task(session_factory, "Later", NOW + timedelta(seconds=30))
+        sent = []
+        scheduler = ReminderScheduler(session_factory, notify=lambda t: sent.append(t.title))
+
+        assert scheduler.tick(NOW) == 2
+        assert sent == ["First", "Second"]
+
+        assert scheduler.tick(NOW + timedelta(seconds=5)) == 0
+        assert scheduler.tick(NOW + timedelta(seconds=31)) == 1
+        assert sent == ["First", "Second", "Later"]
+
+    def test_only_loads_window(self, session_factory):
+        """
+        Test: Reminders beyond the horizon are not loaded into memory.
+        """
+        add_task(session_factory, "Soon", NOW + timedelta(seconds=30))
+        add_task(session_factory, "Next month", NOW + timedelta(days=30))
+        scheduler = ReminderScheduler(session_factory, notify=lambda t: None,
+                                      horizon=timedelta(minutes=1))
+
+        scheduler.tick(NOW)
+
+        assert len(scheduler) == 1
+
+    def test_loads_incrementally_in_batches(self, session_factory):
+        """
+        Test: With a small batch size, a backlog is drained over several
+        loads and every reminder still fires exactly once.
+        """
+        for i in range(7):
+            add_task(session_factory, f"Task {i}", NOW - timedelta(seconds=60 - i))
+        sent = []
+        scheduler = ReminderScheduler(session_factory, notify=lambda t: sent.append(t.title),
+                                      batch_size=3)
+
+        total = sum(scheduler.tick(NOW) for _ in range(5))
+
+        assert total == 7
+        assert sent == [f"Task {i}" for i in range(7)]
+
+    def test_skips_changed_reminders(self, session_factory):
+        """
+        Test: A reminder completed after being loaded does not fire,
+        and a fired reminder is cleared in the database.
+        """
+        done_id = add_task(session_factory, "Done", NOW + timedelta(seconds=10))
+        keep_id = add_task(session_factory, "Keep", NOW + timedelta(seconds=10))
+        sent = []
+        scheduler = ReminderScheduler(session_factory, notify=lambda t: sent.append(t.title))
+        scheduler.tick(NOW)
+
+        db = session_factory()
+        db.query(Tasks).filter(Tasks.id == done_id).update({Tasks.complete: True})
+        db.commit()
+
+        scheduler.tick(NOW + timedelta(seconds=20))
+
+        assert sent == ["Keep"]
+        assert db.query(Tasks).filter(Tasks.id == keep_id).first().remind_at is None
+        db.close()
+
+    def test_two_schedulers_fire_once(self, session_factory):
+        """
+        Test: Two schedulers (e.g. two workers) never send the same reminder.
+        """
+        add_task(session_factory, "Only once", NOW - timedelta(seconds=1))
+        sent = []
+        first = ReminderScheduler(session_factory, notify=lambda t: sent.append(t.title))
+        second = ReminderScheduler(session_factory, notify=lambda t: sent.append(t.title))
+
+        first.load(NOW)
+        second.load(NOW)
+        first.tick(NOW)
+        second.tick(NOW)
+
+        assert sent == ["Only once"]
+
+    def test_clear_completed_reminders(self, session_factory):
+        """
+        Test: Reminders left on completed tasks are cleared; open tasks
+        keep theirs.
+        """
+        done_id = add_task(session_factory, "Done", NOW, complete=True)
+        open_id = add_task(session_factory, "Open", NOW)
+        db = session_factory()
+
+        assert clear_completed_reminders(db) == 1
+
+        reminders = dict(db.query(Tasks.id, Tasks.remind_at))
+        assert reminders[done_id] is None
+        assert reminders[open_id] is not None
+        db.close()
+
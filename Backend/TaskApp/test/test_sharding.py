@@ -0,0 +1,335 @@
+"""
+test_sharding.py - Sharded Mode Tests
+
+Tests for the owner_id -> shard resolver, per-request shard sessions
+and the rebalancing tool. Each shard is a separate SQLite file with
+foreign keys enforced.
+
+HOW TO RUN:
+    pytest test/test_sharding.py -v
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import status
+from sqlalchemy import event, inspect
+
+import database
+from database import make_engine
+from models import IdempotencyKeys, TaskEvents, Tasks, TasksArchive
+from rebalance import move_owner_tasks, rebalance
+from sharding import HashRing, ShardSet
+
+
+def make_shard_engine(path):
+    """A SQLite shard that enforces foreign keys, like Postgres would."""
+    engine = make_engine(f"sqlite:///{path}")
+    event.listen(engine, "connect",
+                 lambda connection, record: connection.execute("PRAGMA foreign_keys=ON"))
+    database.create_shard_tables(engine)
+    return engine
+
+
+@pytest.fixture
+def make_shards(tmp_path):
+    """Returns a factory building a ShardSet over N SQLite files."""
+    created = []
+
+    def factory(count):
+        engines = [make_shard_engine(tmp_path / f"shard{i}.db") for i in range(count)]
+        created.extend(engines)
+        return ShardSet(engines)
+
+    yield factory
+
+    for engine in created:
+        engine.dispose()
+
+
+def add_tasks(shard_set, owner_id, count):
+    db = shard_set.session_for(owner_id)
+    for i in range(count):
+        db.add(Tasks(title=f"Task {i}", description="Description",
+                     priority=1, owner_id=owner_id))
+    db.commit()
+    db.close()
+
+
+def count_tasks(shard_set, name, owner_id):
+    db = shard_set.session(name)
+    try:
+        return db.query(Tasks).filter(Tasks.owner_id == owner_id).count()
+    finally:
+        db.close()
+
+
+# =============================================================================
+# RESOLVER TESTS
+# =============================================================================
+
+class TestHashRing:
+    """Tests for the consistent hash ring"""
+
+    def test_same_owner_same_shard(self):
+        """
+        Test: Resolving the same owner twice gives the same shard.
+        """
+        ring = HashRing(["shard0", "shard1", "shard2"])
+
+        assert all(ring.get(owner) == ring.get(owner) for owner in range(100))
+
+    def test_adding_shard_moves_few_owners(self):
+        """
+        Test: Adding a 4th shard should only move owners onto the new shard,
+        and roughly a quarter of them.
+        """
+        ring = HashRing(["shard0", "shard1", "shard2"])
+        before = {owner: ring.get(owner) for owner in range(2000)}
+
+        ring.add("shard3")
+        after = {owner: ring.get(owner) for owner in range(2000)}
+
+        moved = [owner for owner in before if before[owner] != after[owner]]
+        assert all(after[owner] == "shard3" for owner in moved)
+        assert 0.1 < len(moved) / 2000 < 0.4
+
+    def test_empty_ring(self):
+        """
+        Test: Resolving on a ring without shards should fail loudly.
+        """
+        with pytest.raises(LookupError):
+            HashRing().get(1)
+
+
+# =============================================================================
+# SHARDED API TESTS
+# =============================================================================
+
+class TestShardedTasks:
+    """Tests for /tasks/ endpoints with sharding enabled"""
+
+    def test_tasks_stored_on_owner_shard(self, client, auth_headers, make_shards, monkeypatch):
+        """
+        Test: Tasks created through the API end up on the owner's shard
+        and are read back from it.
+        """
+        shard_set = make_shards(2)
+        monkeypatch.setattr(database, "shards", shard_set)
+
+        response = client.post("/tasks/", headers=auth_headers, json={
+            "title": "Sharded Task",
+            "description": "Lives on a shard",
+            "priority": 2,
+            "complete": False
+        })
+        assert response.status_code == status.HTTP_201_CREATED
+
+        tasks = client.get("/tasks/", headers=auth_headers).json()
+        assert [task["title"] for task in tasks] == ["Sharded Task"]
+
+        owner_id = tasks[0]["owner_id"]
+        home = shard_set.shard_for(owner_id)
+        other = next(name for name in shard_set.names if name != home)
+        assert count_tasks(shard_set, home, owner_id) == 1
+        assert count_tasks(shard_set, other, owner_id) == 0
+
+    def test_projects_rejected_when_sharded(self, client, auth_headers, make_shards,
+                                            monkeypatch):
+        """
+        Test: Shards cannot check project membership, so project tasks are
+        refused instead of being stored where other members can't see them.
+
+        Expected: 400 Bad Request
+        """
+        project_id = client.post("/projects/", json={"name": "Team"},
+                                 headers=auth_headers).json()["id"]
+        monkeypatch.setattr(database, "shards", make_shards(2))
+        task = {"title": "Shared", "description": "Description", "priority": 1,
+                "project_id": project_id}
+
+        created = client.post("/tasks/", headers=auth_headers, json=task)
+        listed = client.get("/tasks/", params={"project_id": project_id}, headers=auth_headers)
+
+        assert created.status_code == status.HTTP_400_BAD_REQUEST
+        assert listed.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_shards_hold_only_task_tables(self, make_shards):
+        """
+        Test: Shards get the task tables without foreign keys to users or
+        projects, which only exist in the main database.
+        """
+        engine = make_shards(1).engines["shard0"]
+        inspector = inspect(engine)
+
+        assert set(inspector.get_table_names()) == set(database.SHARD_TABLES)
+        assert all(inspector.get_foreign_keys(name) == [] for name in database.SHARD_TABLES)
+
+    def test_task_ids_unique_across_shards(self, client, auth_headers, make_shards,
+                                           monkeypatch, test_db):
+        """
+        Test: In sharded mode ids come from the main database, after every
+        id the shards already used.
+        """
+        shard_set = make_shards(2)
+        monkeypatch.setattr(database, "shards", shard_set)
+        add_tasks(shard_set, 1, 3)
+        add_tasks(shard_set, 2, 3)
+        highest = database.highest_task_id(shard_set)
+        database.seed_task_ids(test_db, highest)
+
+        task = {"title": "Sharded Task", "description": "Lives on a shard", "priority": 2}
+        ids = [client.post("/tasks/", headers=auth_headers, json=task).json()["id"]
+               for _ in range(2)]
+
+        assert ids == [highest + 1, highest + 2]
+
+
+# =============================================================================
+# REBALANCE TESTS
+# =============================================================================
+
+class TestRebalance:
+    """Tests for moving tasks after a shard is added"""
+
+    def test_rebalance_after_adding_shard(self, tmp_path, make_shards, test_db):
+        """
+        Test: After growing from 2 to 3 shards, rebalance moves every owner
+        the ring now sends to the new shard, and nobody else.
+        """
+        old = make_shards(2)
+        for owner in range(1, 31):
+            add_tasks(old, owner, 2)
+
+        new = ShardSet(list(old.engines.values()) + [make_shard_engine(tmp_path / "shard2.db")])
+
+        moved = rebalance(new, test_db)
+
+        expected = {owner for owner in range(1, 31) if new.shard_for(owner) != old.shard_for(owner)}
+        assert set(moved) == expected
+        assert all(count == 2 for count in moved.values())
+        for owner in range(1, 31):
+            for name in new.names:
+                wanted = 2 if name == new.shard_for(owner) else 0
+                assert count_tasks(new, name, owner) == wanted
+        new.engines["shard2"].dispose()
+
+    def test_rebalance_is_noop_when_balanced(self, make_shards, test_db):
+        """
+        Test: Running rebalance on correctly placed data moves nothing.
+        """
+        shard_set = make_shards(3)
+        for owner in range(1, 11):
+            add_tasks(shard_set, owner, 1)
+
+        assert rebalance(shard_set, test_db) == {}
+
+    def test_rebalance_keeps_task_ids(self, make_shards, test_db):
+        """
+        Test: Moved tasks keep their ids when the target shard doesn't use them.
+        """
+        shard_set = make_shards(2)
+        owner = next(o for o in range(1, 100) if shard_set.shard_for(o) == "shard1")
+        db = shard_set.session("shard0")
+        for task_id in (101, 102):
+            db.add(Tasks(id=task_id, title="Task", description="Description",
+                         priority=1, owner_id=owner))
+        db.commit()
+        db.close()
+
+        rebalance(shard_set, test_db)
+
+        db = shard_set.session("shard1")
+        assert sorted(t.id for t in db.query(Tasks)) == [101, 102]
+        db.close()
+
+    def test_rebalance_moves_history_of_renumbered_task(self, make_shards, test_db):
+        """
+        Test: A task whose id is taken on the target shard gets a new id,
+        and its audit events follow it.
+        """
+        shard_set = make_shards(2)
+        mover = next(o for o in range(1, 100) if shard_set.shard_for(o) == "shard1")
+        stayer = next(o for o in range(1, 100) if shard_set.shard_for(o) == "shard1"
+                      and o != mover)
+        # Both tasks got id 1 from their own shard, before ids were allocated centrally
+        for name, owner in (("shard0", mover), ("shard1", stayer)):
+            db = shard_set.session(name)
+            db.add(Tasks(id=1, title="Task", description="Description", priority=1,
+                         owner_id=owner))
+            db.commit()
+            db.close()
+        test_db.add(TaskEvents(task_id=1, owner_id=mover, actor_id=mover, action="create",
+                               ts=datetime.now(timezone.utc)))
+        test_db.commit()
+
+        rebalance(shard_set, test_db)
+
+        db = shard_set.session("shard1")
+        new_id = db.query(Tasks.id).filter(Tasks.owner_id == mover).scalar()
+        db.close()
+        assert new_id != 1
+        assert test_db.query(TaskEvents.task_id).filter(TaskEvents.owner_id == mover)\
+            .scalar() == new_id
+
+    def test_rebalance_moves_archive_and_idempotency_keys(self, make_shards, test_db):
+        """
+        Test: An owner's archived tasks and Idempotency-Key entries move
+        with their live tasks.
+        """
+        shard_set = make_shards(2)
+        owner = next(o for o in range(1, 100) if shard_set.shard_for(o) == "shard1")
+        db = shard_set.session("shard0")
+        db.add(TasksArchive(id=5, title="Done", description="Description", priority=1,
+                            complete=True, owner_id=owner))
+        db.add(IdempotencyKeys(user_id=owner, key="abc", request_hash="x", status_code=201,
+                               response_body='{"id": 5}'))
+        db.commit()
+        db.close()
+
+        assert rebalance(shard_set, test_db) == {owner: 1}
+
+        for name, wanted in (("shard0", 0), ("shard1", 1)):
+            db = shard_set.session(name)
+            assert db.query(TasksArchive).filter(TasksArchive.owner_id == owner).count() == wanted
+            assert db.query(IdempotencyKeys).filter(IdempotencyKeys.user_id == owner)\
+                .count() == wanted
+            db.close()
+
+    def test_rebalance_keeps_tasks_written_during_move(self, make_shards, test_db):
+        """
+        Test: A task created or updated on the source while its owner is
+        being moved is not lost; it stays on the source for the next run.
+        """
+        shard_set = make_shards(2)
+        owner = next(o for o in range(1, 100) if shard_set.shard_for(o) == "shard1")
+        db = shard_set.session("shard0")
+        db.add_all([Tasks(id=1, title="Moved", priority=1, owner_id=owner),
+                    Tasks(id=2, title="Updated", priority=1, owner_id=owner)])
+        db.commit()
+        db.close()
+
+        source, target = shard_set.session("shard0"), shard_set.session("shard1")
+        target_commit = target.commit
+
+        def commit_with_concurrent_writes():
+            target_commit()
+            target.commit = target_commit
+            # A worker still on the old shard list writes in the meantime
+            other = shard_set.session("shard0")
+            other.add(Tasks(id=3, title="Created", priority=1, owner_id=owner))
+            other.query(Tasks).filter(Tasks.id == 2)\
+                .update({Tasks.priority: 5, Tasks.version: Tasks.version + 1})
+            other.commit()
+            other.close()
+
+        target.commit = commit_with_concurrent_writes
+        assert move_owner_tasks(owner, source, target, test_db) == 1
+        source.close()
+        target.close()
+
+        for name, titles in (("shard0", ["Updated", "Created"]), ("shard1", ["Moved"])):
+            db = shard_set.session(name)
+            assert [t.title for t in db.query(Tasks).order_by(Tasks.id)] == titles
+            db.close()
+
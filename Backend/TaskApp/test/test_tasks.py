@@ -9,6 +9,7 @@ HOW TO RUN:
 """
 
 import pytest
+from datetime import datetime, timedelta, timezone
 from fastapi import status
 
 
@@ -328,3 +329,223 @@ class TestDeleteTask:
         
         # Should be 404 because task doesn't belong to User 2
         assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+# =============================================================================
+# DUE DATE TESTS
+# =============================================================================
+
+class TestDueTasks:
+    """Tests for due_at/remind_at and GET /tasks/due"""
+
+    def create(self, client, headers, title, due_at=None, complete=False):
+        return client.post("/tasks/", headers=headers, json={
+            "title": title,
+            "description": "Description",
+            "priority": 3,
+            "complete": complete,
+            "due_at": due_at.isoformat() if due_at else None,
+        })
+
+    def test_create_task_with_due_date(self, client, auth_headers):
+        """
+        Test: due_at and remind_at are stored and returned.
+
+        Expected: 201 Created, then both fields on read
+        """
+        response = client.post("/tasks/", headers=auth_headers, json={
+            "title": "Pay rent",
+            "description": "Before the 1st",
+            "priority": 4,
+            "due_at": "2030-01-01T09:00:00Z",
+            "remind_at": "2029-12-31T09:00:00Z"
+        })
+
+        assert response.status_code == status.HTTP_201_CREATED
+        task = client.get("/tasks/", headers=auth_headers).json()[0]
+        assert task["due_at"].startswith("2030-01-01T09:00:00")
+        assert task["remind_at"].startswith("2029-12-31T09:00:00")
+
+    def test_due_within_window(self, client, auth_headers):
+        """
+        Test: /tasks/due returns open tasks due within the window
+        (1 day by default), overdue ones included, soonest first.
+        """
+        now = datetime.now(timezone.utc)
+        self.create(client, auth_headers, "In two hours", now + timedelta(hours=2))
+        self.create(client, auth_headers, "Overdue", now - timedelta(hours=1))
+        self.create(client, auth_headers, "Next week", now + timedelta(days=7))
+        self.create(client, auth_headers, "No due date")
+        self.create(client, auth_headers, "Done already", now, complete=True)
+
+        response = client.get("/tasks/due", headers=auth_headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [task["title"] for task in response.json()] == ["Overdue", "In two hours"]
+
+    def test_due_window_iso_duration(self, client, auth_headers):
+        """
+        Test: within takes an ISO 8601 duration.
+        """
+        now = datetime.now(timezone.utc)
+        self.create(client, auth_headers, "Next week", now + timedelta(days=7))
+
+        response = client.get("/tasks/due?within=P8D", headers=auth_headers)
+
+        assert [task["title"] for task in response.json()] == ["Next week"]
+
+    def test_update_without_due_date_keeps_it(self, client, auth_headers):
+        """
+        Test: An update that doesn't send due_at/remind_at (e.g. from an
+        older client) leaves them unchanged.
+        """
+        client.post("/tasks/", headers=auth_headers, json={
+            "title": "Pay rent", "description": "Before the 1st", "priority": 4,
+            "due_at": "2030-01-01T09:00:00Z", "remind_at": "2029-12-31T09:00:00Z"
+        })
+        task_id = client.get("/tasks/", headers=auth_headers).json()[0]["id"]
+
+        client.put(f"/tasks/{task_id}", headers=auth_headers, json={
+            "title": "Pay rent", "description": "Before the 1st", "priority": 5,
+            "complete": False
+        })
+
+        task = client.get(f"/tasks/{task_id}", headers=auth_headers).json()
+        assert task["priority"] == 5
+        assert task["due_at"].startswith("2030-01-01T09:00:00")
+        assert task["remind_at"].startswith("2029-12-31T09:00:00")
+
+    def test_completing_clears_reminder(self, client, auth_headers):
+        """
+        Test: Completing a task clears remind_at (it would never fire) and
+        keeps due_at.
+        """
+        client.post("/tasks/", headers=auth_headers, json={
+            "title": "Pay rent", "description": "Before the 1st", "priority": 4,
+            "due_at": "2030-01-01T09:00:00Z", "remind_at": "2029-12-31T09:00:00Z"
+        })
+        task_id = client.get("/tasks/", headers=auth_headers).json()[0]["id"]
+
+        client.put(f"/tasks/{task_id}", headers=auth_headers, json={
+            "title": "Pay rent", "description": "Before the 1st", "priority": 4,
+            "complete": True, "remind_at": "2029-12-31T10:00:00Z"
+        })
+
+        task = client.get(f"/tasks/{task_id}", headers=auth_headers).json()
+        assert task["complete"] is True
+        assert task["due_at"].startswith("2030-01-01T09:00:00")
+        assert task["remind_at"] is None
+
+    def test_update_can_clear_due_date(self, client, auth_headers):
+        """
+        Test: Sending due_at: null explicitly removes the due date.
+        """
+        self.create(client, auth_headers, "Someday", datetime(2030, 1, 1, tzinfo=timezone.utc))
+        task_id = client.get("/tasks/", headers=auth_headers).json()[0]["id"]
+
+        client.put(f"/tasks/{task_id}", headers=auth_headers, json={
+            "title": "Someday", "description": "Description", "priority": 3,
+            "complete": False, "due_at": None
+        })
+
+        assert client.get(f"/tasks/{task_id}", headers=auth_headers).json()["due_at"] is None
+
+
+# =============================================================================
+# OPTIMISTIC CONCURRENCY TESTS
+# =============================================================================
+
+class TestTaskVersions:
+    """Tests for task versions, ETag and If-Match"""
+
+    updated_data = {
+        "title": "Updated Title",
+        "description": "Updated Description",
+        "priority": 5,
+        "complete": True
+    }
+
+    def test_new_task_has_version_1(self, client, auth_headers, test_task):
+        """
+        Test: Reads return the version; a new task starts at 1.
+        """
+        tasks = client.get("/tasks/", headers=auth_headers).json()
+
+        assert tasks[0]["version"] == 1
+
+    def test_read_task_etag(self, client, auth_headers, test_task):
+        """
+        Test: GET /tasks/{id} returns an ETag, and 304 when it still matches.
+        """
+        response = client.get(f"/tasks/{test_task['id']}", headers=auth_headers)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] == '"1"'
+
+        cached = client.get(f"/tasks/{test_task['id']}",
+                            headers={**auth_headers, "If-None-Match": '"1"'})
+        assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_update_with_matching_version(self, client, auth_headers, test_task):
+        """
+        Test: Updating with the current version succeeds and bumps it.
+
+        Expected: 204 No Content with the new ETag
+        """
+        response = client.put(f"/tasks/{test_task['id']}", json=self.updated_data,
+                              headers={**auth_headers, "If-Match": '"1"'})
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert response.headers["ETag"] == '"2"'
+        assert client.get("/tasks/", headers=auth_headers).json()[0]["version"] == 2
+
+    def test_update_with_stale_version(self, client, auth_headers, test_task):
+        """
+        Test: Two clients edit the same version; the second one is rejected.
+
+        Expected: 409 Conflict, first edit kept
+        """
+        first = client.put(f"/tasks/{test_task['id']}", json=self.updated_data,
+                           headers={**auth_headers, "If-Match": '"1"'})
+        second = client.put(f"/tasks/{test_task['id']}",
+                            json={**self.updated_data, "title": "Clobbered"},
+                            headers={**auth_headers, "If-Match": '"1"'})
+
+        assert first.status_code == status.HTTP_204_NO_CONTENT
+        assert second.status_code == status.HTTP_409_CONFLICT
+        assert client.get("/tasks/", headers=auth_headers).json()[0]["title"] == "Updated Title"
+
+    def test_update_without_if_match_still_works(self, client, auth_headers, test_task):
+        """
+        Test: Clients that don't send If-Match keep last-write-wins behaviour.
+        """
+        client.put(f"/tasks/{test_task['id']}", json=self.updated_data, headers=auth_headers)
+        response = client.put(f"/tasks/{test_task['id']}", json=self.updated_data,
+                              headers=auth_headers)
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert response.headers["ETag"] == '"3"'
+
+    def test_delete_with_stale_version(self, client, auth_headers, test_task):
+        """
+        Test: Deleting with an old version is rejected.
+
+        Expected: 409 Conflict
+        """
+        client.put(f"/tasks/{test_task['id']}", json=self.updated_data, headers=auth_headers)
+
+        response = client.delete(f"/tasks/{test_task['id']}",
+                                 headers={**auth_headers, "If-Match": 'W/"1"'})
+
+        assert response.status_code == status.HTTP_409_CONFLICT
+
+    def test_invalid_if_match(self, client, auth_headers, test_task):
+        """
+        Test: A malformed If-Match header is a client error.
+
+        Expected: 400 Bad Request
+        """
+        response = client.put(f"/tasks/{test_task['id']}", json=self.updated_data,
+                              headers={**auth_headers, "If-Match": "abc"})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST